@@ -0,0 +1,96 @@
+# Replays one long /ask conversation against the configured openai backend twice: with history
+# trimmed by token budget only, and with rolling-summary compaction. Prints the prompt size and
+# prefill time (until the first streamed token) per turn, and whether the model still recalls
+# facts from the start of the conversation. Needs the backend from config.yaml running. Run from the repo root:
+#   python benchmarks/ask_compaction.py
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import llm
+from router import create_router
+from conversations import ConversationStore
+
+TURNS = [
+    "Hi! My name is Mira and I'm planning a trip to Lisbon in May.",
+    "I'll be there for five days. I love seafood but I'm allergic to shellfish.",
+    "What neighbourhoods should I stay in if I like nightlife but want to sleep?",
+    "How do I get from the airport to the city centre?",
+    "Is it worth getting a Lisboa Card for five days?",
+    "What are some good day trips? I don't drive.",
+    "Tell me about Sintra, how long should I spend there?",
+    "Any tips for avoiding crowds at the Belém tower?",
+    "What's a typical Portuguese breakfast?",
+    "Can you suggest a rough plan for day three?",
+    "What should I pack for the weather in May?",
+    "How much should I budget per day for food?",
+]
+RECALL = "Remind me: what's my name, where am I going, and what am I allergic to?"
+FACTS = ["mira", "lisbon", "shellfish"]
+
+
+async def run(router, system: str, compact: bool) -> tuple[list[tuple[int, int | None, float]], str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        async def summarize(user_id, previous, messages):
+            return await llm.summarize(router.complete, previous, messages)
+
+        store = ConversationStore(
+            os.path.join(tmp, "history.sqlite3"), token_budget=1500, max_users=10, idle_ttl=3600, max_age=86400,
+            summarize=summarize if compact else None, compact_tokens=800
+        )
+        await store.open()
+        rows = []
+        answer = ""
+        for prompt in TURNS + [RECALL]:
+            # let a compaction started by the previous turn finish, as it would between real messages
+            await asyncio.gather(*store.compacting.values())
+            summary, history = await store.history(1)
+            messages = llm.build_messages(system, summary, history, prompt, datetime.now())
+
+            start = time.monotonic()
+            prefill = None
+            usage = None
+            think = llm.ThinkFilter()
+            parts = []
+            async with router.stream(messages=messages, stream_options={"include_usage": True}) as stream:
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage.prompt_tokens
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if prefill is None:
+                            prefill = time.monotonic() - start
+                        parts.append(think.feed(chunk.choices[0].delta.content))
+            answer = ("".join(parts) + think.flush()).strip()
+            rows.append((llm.estimate_tokens(messages), usage, prefill or 0.0))
+            await store.append(1, {"role": "user", "content": prompt}, {"role": "assistant", "content": answer})
+        await store.close()
+        return rows, answer
+
+
+async def main():
+    with open("config.yaml", "r") as file:
+        config = yaml.safe_load(file)
+    router = create_router(config["openai"])
+    system = config["openai"]["system_message"]
+
+    for compact in (False, True):
+        rows, answer = await run(router, system, compact)
+        print(f"\n{'compaction' if compact else 'trimming only'}:")
+        print("turn  est. tokens  server tokens  prefill")
+        for turn, (estimate, usage, prefill) in enumerate(rows, start=1):
+            print(f"{turn:4}  {estimate:11}  {usage if usage is not None else '-':>13}  {prefill:6.2f}s")
+        late = rows[len(rows) // 2:]
+        print(f"second half: {sum(r[0] for r in late) / len(late):.0f} tokens, {sum(r[2] for r in late) / len(late):.2f}s prefill on average")
+        recalled = [fact for fact in FACTS if fact in answer.lower()]
+        print(f"recalled {len(recalled)}/{len(FACTS)} facts from the first turns: {', '.join(recalled) or 'none'}")
+    await router.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+# Compares the old two-process GIF flow (palettegen to a png, then paletteuse) against
+# the single-decode split graph in gif.py. Run from the repo root:
+#   python benchmarks/gif_pipeline.py [input.mp4] [runs]
+# Without an input, a 10 second 720p test pattern is generated.
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gif import gif_command, DURATION_TRIM, MAX_SCALE
+
+FPS = 15
+COLORS = 256
+
+
+def two_process(input_path: str, output_path: str, palette_path: str):
+    filters = f"fps={FPS},scale={MAX_SCALE}:-1:flags=bicubic"
+    subprocess.run([
+        "ffmpeg", "-y",
+        "-i", input_path,
+        "-t", str(DURATION_TRIM),
+        "-vf", f"{filters},palettegen",
+        palette_path
+    ], check=True, capture_output=True)
+    subprocess.run([
+        "ffmpeg", "-y",
+        "-i", input_path,
+        "-i", palette_path,
+        "-t", str(DURATION_TRIM),
+        "-lavfi", f"{filters} [x]; [x][1:v] paletteuse=dither=none",
+        output_path
+    ], check=True, capture_output=True)
+
+
+def single_graph(input_path: str, output_path: str, palette_path: str):
+    subprocess.run(gif_command(input_path, output_path, MAX_SCALE, FPS, COLORS), check=True, capture_output=True)
+
+
+def measure(func, runs: int, *args) -> tuple[float, float]:
+    """Average wall time and child CPU seconds per run."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(*args)
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return wall / runs, cpu / runs
+
+
+def main():
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if len(sys.argv) > 1:
+            input_path = sys.argv[1]
+        else:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            subprocess.run([
+                "ffmpeg", "-y",
+                "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={DURATION_TRIM}",
+                "-c:v", "libx264", "-preset", "veryfast",
+                input_path
+            ], check=True, capture_output=True)
+
+        output_path = os.path.join(tmpdir, "out.gif")
+        palette_path = os.path.join(tmpdir, "palette.png")
+
+        print(f"{'flow':<14}{'wall s':>10}{'cpu s':>10}{'size KB':>10}")
+        for name, func in (("two-process", two_process), ("single-graph", single_graph)):
+            wall, cpu = measure(func, runs, input_path, output_path, palette_path)
+            size = os.path.getsize(output_path) // 1024
+            print(f"{name:<14}{wall:>10.2f}{cpu:>10.2f}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# Accuracy and latency of the local language detector (language.detect) on a mixed-language
+# set of chat-style messages, none of which appear in its training samples. Run from the repo root:
+#   python benchmarks/language_id.py [runs]
+# "wrong" is the number that matters most: a message wrongly called English is never translated.
+# Languages it has no model for are counted separately, it should abstain on those.
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import language
+
+TEST_SET = [
+    ("en", "can someone explain why my code keeps crashing when I open the settings page"),
+    ("en", "I'll be home late tonight, don't wait for me for dinner"),
+    ("en", "honestly the ending of that show was so disappointing"),
+    ("en", "did you remember to buy milk on the way back?"),
+    ("en", "we should really clean up the channel list at some point"),
+    ("en", "the bot is down again, can an admin take a look <@123456789012345678>"),
+    ("en", "check this out https://example.com/watch?v=abc it's hilarious"),
+    ("en", "good morning everyone, hope you all slept well"),
+    ("en", "my cat knocked the glass off the table again"),
+    ("en", "nah I'm good, maybe next time"),
+    ("es", "alguien sabe a qué hora empieza el partido esta noche"),
+    ("es", "no puedo creer que ya sea viernes otra vez"),
+    ("es", "mi hermana viene a visitarnos la semana que viene"),
+    ("es", "el examen de mañana va a ser dificilísimo"),
+    ("es", "me encanta esta canción, la escucho todos los días"),
+    ("es", "oye, ¿tienes un cargador que me prestes?"),
+    ("fr", "quelqu'un a une idée de ce qu'on mange ce soir"),
+    ("fr", "je n'arrive pas à dormir, il fait beaucoup trop chaud"),
+    ("fr", "on se retrouve devant la gare à dix-huit heures"),
+    ("fr", "j'ai oublié mon parapluie chez toi hier soir"),
+    ("fr", "c'est vraiment le meilleur restaurant du quartier"),
+    ("fr", "tu as vu le dernier épisode de la série ?"),
+    ("de", "kann mir jemand erklären, warum das nicht funktioniert"),
+    ("de", "ich habe heute keine Lust, zur Arbeit zu gehen"),
+    ("de", "wir treffen uns morgen um zehn vor dem Bahnhof"),
+    ("de", "der Zug hat schon wieder zwanzig Minuten Verspätung"),
+    ("de", "hast du schon das neue Album gehört?"),
+    ("de", "meine Mutter kocht heute Abend Spaghetti"),
+    ("it", "qualcuno sa a che ora apre il negozio domani"),
+    ("it", "non ho voglia di studiare oggi, fa troppo caldo"),
+    ("it", "ci vediamo stasera davanti al cinema"),
+    ("it", "mia nonna fa la pizza più buona del mondo"),
+    ("it", "hai visto la partita di ieri sera?"),
+    ("pt", "alguém sabe que horas começa o jogo hoje à noite"),
+    ("pt", "não acredito que já é sexta-feira de novo"),
+    ("pt", "minha irmã vem nos visitar na semana que vem"),
+    ("pt", "essa música é muito boa, escuto todos os dias"),
+    ("pt", "você viu o último episódio da série?"),
+    ("nl", "weet iemand hoe laat de wedstrijd vanavond begint"),
+    ("nl", "ik heb vandaag echt geen zin om te werken"),
+    ("nl", "we spreken morgen om tien uur af bij het station"),
+    ("nl", "mijn fiets is alweer gestolen, ongelooflijk"),
+    ("pl", "ktoś wie, o której zaczyna się dzisiaj mecz"),
+    ("pl", "nie mogę uwierzyć, że znowu jest piątek"),
+    ("pl", "moja siostra przyjeżdża do nas w przyszłym tygodniu"),
+    ("pl", "widziałeś ostatni odcinek tego serialu?"),
+    ("sv", "vet någon när matchen börjar i kväll"),
+    ("sv", "jag orkar verkligen inte jobba i dag"),
+    ("sv", "vi ses i morgon klockan tio vid stationen"),
+    ("sv", "min cykel har blivit stulen igen"),
+    ("tr", "maç bu akşam saat kaçta başlıyor bilen var mı"),
+    ("tr", "yine cuma olduğuna inanamıyorum"),
+    ("tr", "kız kardeşim gelecek hafta bizi ziyarete geliyor"),
+    ("tr", "dün akşamki maçı izledin mi?"),
+    ("id", "ada yang tahu pertandingan malam ini mulai jam berapa"),
+    ("id", "aku tidak percaya sudah hari jumat lagi"),
+    ("id", "adikku akan datang berkunjung minggu depan"),
+    ("id", "kamu sudah nonton episode terakhir belum?"),
+    ("vi", "có ai biết trận đấu tối nay bắt đầu lúc mấy giờ không"),
+    ("vi", "không thể tin được lại là thứ sáu rồi"),
+    ("vi", "em gái tôi sẽ đến thăm vào tuần sau"),
+    ("ru", "кто-нибудь знает, во сколько начинается матч сегодня вечером"),
+    ("ru", "не могу поверить, что опять пятница"),
+    ("uk", "хтось знає, о котрій сьогодні починається матч"),
+    ("ja", "今日の試合は何時から始まるか知ってる人いますか"),
+    ("ja", "また金曜日だなんて信じられない"),
+    ("ko", "오늘 밤 경기 몇 시에 시작하는지 아는 사람 있어요?"),
+    ("zh-cn", "有人知道今晚的比赛几点开始吗"),
+    ("ar", "هل يعرف أحد متى تبدأ المباراة الليلة"),
+    ("el", "ξέρει κανείς τι ώρα αρχίζει ο αγώνας απόψε"),
+    ("hi", "क्या किसी को पता है कि आज रात मैच कितने बजे शुरू होगा"),
+    ("th", "มีใครรู้ไหมว่าการแข่งขันคืนนี้เริ่มกี่โมง"),
+    # too short or ambiguous to call, should come back as None rather than a guess
+    (None, "ok"),
+    (None, "lol"),
+    (None, "👍👍"),
+    (None, "https://example.com/image.png"),
+]
+
+# Latin script languages detect() has no model for. Abstaining is right for these, any answer
+# is wrong, and calling one English means it's never translated.
+UNMODELLED = [
+    ("cy", "Dw i'n meddwl y dylet ti roi cynnig ar y fersiwn newydd."),
+    ("cy", "oes rhywun yn gwybod faint o'r gloch mae'r gêm yn dechrau heno"),
+    ("cy", "dw i ddim yn gallu credu ei bod hi'n ddydd Gwener eto"),
+    ("ga", "an bhfuil a fhios ag aon duine cén t-am a thosóidh an cluiche anocht"),
+    ("tl", "may nakakaalam ba kung anong oras magsisimula ang laro mamayang gabi"),
+    ("tl", "hindi ako makapaniwala na Biyernes na naman"),
+    ("tl", "pupunta ang kapatid ko para bumisita sa susunod na linggo"),
+    ("sw", "kuna mtu anajua mechi inaanza saa ngapi usiku wa leo"),
+    ("sw", "siwezi kuamini kwamba ni Ijumaa tena"),
+    ("sw", "dada yangu atakuja kututembelea wiki ijayo"),
+    ("ms", "ada sesiapa tahu pukul berapa perlawanan bermula malam ini"),
+    ("ms", "saya tak percaya dah hari Jumaat lagi"),
+    ("af", "weet iemand hoe laat die wedstryd vanaand begin"),
+    ("af", "ek kan nie glo dit is weer Vrydag nie"),
+    ("af", "my suster kom volgende week by ons kuier"),
+    ("da", "er der nogen der ved hvornår kampen starter i aften"),
+    ("no", "jeg orker virkelig ikke å jobbe i dag"),
+    ("fi", "tietääkö kukaan mihin aikaan ottelu alkaa tänä iltana"),
+    ("fi", "en voi uskoa että on taas perjantai"),
+    ("hu", "tudja valaki, hogy hány órakor kezdődik ma este a meccs"),
+    ("hu", "nem hiszem el, hogy megint péntek van"),
+    ("cs", "nevíte někdo, v kolik dnes večer začíná zápas"),
+    ("ro", "știe cineva la ce oră începe meciul în seara asta"),
+    ("hr", "zna li netko u koliko sati večeras počinje utakmica"),
+    ("ca", "algú sap a quina hora comença el partit aquesta nit"),
+    ("eu", "norbaitek badaki zer ordutan hasten den partida gaur gauean"),
+    ("et", "kas keegi teab, mis kell mäng täna õhtul algab"),
+    ("ha", "shin wani ya san lokacin da wasan zai fara a daren yau"),
+]
+
+# Languages written in a script shared with a modelled one. detect() calls them by the script,
+# which is fine for skipping English, but sending that guess upstream as the source language
+# would get them translated wrongly.
+SHARED_SCRIPT = [
+    ("fa", "کسی می‌داند بازی امشب ساعت چند شروع می‌شود"),
+    ("ur", "کیا کسی کو معلوم ہے کہ آج رات میچ کتنے بجے شروع ہوگا"),
+    ("bg", "някой знае ли в колко часа започва мачът довечера"),
+    ("sr", "да ли неко зна у колико сати почиње утакмица вечерас"),
+    ("be", "хто-небудзь ведае, у колькі сёння пачынаецца матч"),
+    ("mr", "आज रात्री सामना किती वाजता सुरू होणार हे कोणाला माहीत आहे का"),
+    ("zh-tw", "有人知道今晚的比賽幾點開始嗎"),
+]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    outcomes = Counter()
+    wrong_en = []
+    for expected, text in TEST_SET:
+        detected = language.detect(text)
+        if detected == expected:
+            outcomes["correct"] += 1
+        elif detected is None:
+            outcomes["abstained"] += 1
+        else:
+            outcomes["wrong"] += 1
+            print(f"  wrong: expected {expected}, got {detected}: {text}")
+            if detected == "en":
+                wrong_en.append(text)
+
+    total = len(TEST_SET)
+    print(f"{total} messages: {outcomes['correct']} correct, {outcomes['abstained']} abstained, {outcomes['wrong']} wrong")
+    print(f"accuracy {outcomes['correct'] / total:.1%}, wrongly called English (never translated): {len(wrong_en)}")
+
+    guessed = Counter()
+    for expected, text in UNMODELLED:
+        detected = language.detect(text)
+        if detected is not None:
+            guessed[detected] += 1
+            print(f"  unmodelled {expected} called {detected}: {text}")
+    print(f"{len(UNMODELLED)} messages in languages without a model: {len(UNMODELLED) - sum(guessed.values())} abstained, "
+          f"{sum(guessed.values())} guessed, called English: {guessed['en']}")
+
+    forced = 0
+    for expected, text in SHARED_SCRIPT:
+        detected = language.detect(text)
+        if detected in language.OWN_SCRIPT:
+            forced += 1
+            print(f"  shared script {expected} sent upstream as {detected}: {text}")
+    print(f"{len(SHARED_SCRIPT)} messages in shared scripts, sent upstream with the wrong source language: {forced}")
+
+    english = sum(1 for expected, _ in TEST_SET if expected == "en")
+    skipped = sum(1 for expected, text in TEST_SET if expected == "en" and language.detect(text) == "en")
+    print(f"English messages answered without an upstream call: {skipped}/{english}")
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        for _, text in TEST_SET:
+            language.detect(text)
+    elapsed = time.perf_counter() - start
+    print(f"latency: {elapsed / (runs * total) * 1e6:.0f}µs per message ({runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Checks the OCR cache's perceptual matching on synthetic screenshots: recompressed copies
+# should reuse the cached text, copies with one character changed must not. Run from the repo root:
+#   python benchmarks/ocr_cache.py
+# Exits with status 1 if any edited screenshot was answered from the cache.
+import asyncio
+import io
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr import OCR
+
+LINES = [
+    "hey did you see the new update",
+    "Meeting moved to 3:45 PM, room B12",
+    "Total: $1,249.99 (incl. 20% VAT)",
+    "the wall clock says 10.5 minutes left",
+    "call me when the coin arrives in 2024",
+]
+EDITS = [("3:45", "3:46"), ("room", "roam"), ("$1,249", "$1,849"), ("10.5", "10,5"), ("wall", "wail"), ("coin", "coln"), ("2024", "2029")]
+
+# (name, size, font size, foreground, background)
+SCREENSHOTS = [
+    ("chat_light", (800, 600), 14, "black", "white"),
+    ("chat_dark", (1366, 768), 12, (220, 221, 222), (54, 57, 63)),
+    ("desktop_1080p", (1920, 1080), 13, "black", "white"),
+    ("phone", (1080, 2340), 20, (220, 221, 222), (54, 57, 63)),
+]
+
+
+def render(size, font_size, fg, bg, lines) -> Image.Image:
+    img = Image.new("RGB", size, bg)
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default(font_size)
+    for i, line in enumerate(lines * (size[1] // (font_size * 2 * len(lines)))):
+        draw.text((20, 20 + i * font_size * 2), line, fill=fg, font=font)
+    return img
+
+
+def encode(img: Image.Image, fmt: str, **params) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+class Pool:
+    """Stands in for the OCR workers, every image it sees gets a text of its own."""
+
+    def __init__(self):
+        self.runs = 0
+
+    async def run(self, job: dict) -> dict:
+        self.runs += 1
+        return {"text": f"text {self.runs}"}
+
+
+async def main():
+    hits = misses = false_hits = 0
+    lookup = []
+    for name, size, font_size, fg, bg in SCREENSHOTS:
+        ocr = OCR(Pool(), 1000, 512 * 1024 * 1024)
+        original = render(size, font_size, fg, bg, LINES)
+        text = await ocr.read(encode(original, "PNG"))
+
+        copies = {f"jpeg q{q}": encode(original, "JPEG", quality=q) for q in (50, 75, 90)}
+        copies["webp q75"] = encode(original, "WEBP", quality=75)
+        for label, data in copies.items():
+            start = time.perf_counter()
+            hit = await ocr.read(data) == text
+            lookup.append(time.perf_counter() - start)
+            hits += hit
+            misses += not hit
+            print(f"{name:<14}{label:<22}{'hit' if hit else 'miss'}")
+
+        for old, new in EDITS:
+            edited = render(size, font_size, fg, bg, [line.replace(old, new) for line in LINES])
+            for label, data in ((f"{old}->{new}", encode(edited, "PNG")), (f"{old}->{new} jpeg", encode(edited, "JPEG", quality=75))):
+                wrong = await ocr.read(data) == text
+                false_hits += wrong
+                if wrong:
+                    print(f"{name:<14}{label:<22}WRONG, got the original's text")
+
+    print(f"\ncopies recognised: {hits}/{hits + misses}, edits answered from cache: {false_hits}")
+    print(f"lookup time for copies: {sum(lookup) / len(lookup) * 1000:.0f} ms on average")
+    sys.exit(1 if false_hits else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
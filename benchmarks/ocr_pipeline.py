@@ -0,0 +1,106 @@
+# Compares plain pytesseract on the raw image (the old path) against the ocr_worker
+# pipeline (preprocessing plus, with tesserocr installed, a reused engine). Run from the repo root:
+#   python benchmarks/ocr_pipeline.py [corpus_dir] [runs]
+# Without a corpus, a fixed set of synthetic screenshots with known text is generated,
+# which also gives an accuracy score.
+import difflib
+import io
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ocr_worker
+import pytesseract
+
+LINES = [
+    "hey did you see the new update",
+    "yeah the download command is way faster now",
+    "Meeting moved to 3:45 PM, room B12",
+    "Error 404: the requested page was not found",
+    "Total: $1,249.99 (incl. 20% VAT)",
+]
+
+# (name, size, font size, foreground, background)
+SCREENSHOTS = [
+    ("chat_light", (800, 600), 14, "black", "white"),
+    ("chat_dark", (800, 600), 14, "white", (54, 57, 63)),
+    ("desktop_1080p", (1920, 1080), 13, "black", "white"),
+    ("phone", (1080, 2340), 42, "black", (245, 245, 245)),
+    ("huge", (4000, 3000), 48, "black", "white"),
+    ("transparent", (600, 300), 16, "black", (0, 0, 0, 0)),
+]
+
+
+def font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def synthetic_corpus() -> list[tuple[str, bytes, str]]:
+    corpus = []
+    for name, size, font_size, fg, bg in SCREENSHOTS:
+        mode = "RGBA" if len(bg) == 4 else "RGB"
+        img = Image.new(mode, size, bg)
+        draw = ImageDraw.Draw(img)
+        for i, line in enumerate(LINES):
+            draw.text((20, 20 + i * font_size * 2), line, fill=fg, font=font(font_size))
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        corpus.append((name, buf.getvalue(), "\n".join(LINES)))
+    return corpus
+
+
+def folder_corpus(path: str) -> list[tuple[str, bytes, str | None]]:
+    corpus = []
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), "rb") as f:
+            corpus.append((name, f.read(), None))
+    return corpus
+
+
+def baseline(data: bytes) -> str:
+    return pytesseract.image_to_string(Image.open(io.BytesIO(data)))
+
+
+def pipeline(data: bytes) -> str:
+    return ocr_worker.recognize(ocr_worker.preprocess(data))
+
+
+def accuracy(text: str, expected: str | None) -> str:
+    if expected is None:
+        return "-"
+    got = " ".join(text.split())
+    want = " ".join(expected.split())
+    return f"{difflib.SequenceMatcher(None, got, want).ratio():.2f}"
+
+
+def main():
+    corpus = folder_corpus(sys.argv[1]) if len(sys.argv) > 1 else synthetic_corpus()
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    if ocr_worker.tesserocr:
+        ocr_worker.api = ocr_worker.tesserocr.PyTessBaseAPI()
+    engine = "tesserocr" if ocr_worker.tesserocr else "pytesseract"
+
+    print(f"{'image':<16}{'old ms':>10}{'old acc':>9}{'new ms':>10}{'new acc':>9}   ({engine})")
+    totals = [0.0, 0.0]
+    for name, data, expected in corpus:
+        row = []
+        for i, func in enumerate((baseline, pipeline)):
+            start = time.perf_counter()
+            for _ in range(runs):
+                text = func(data)
+            elapsed = (time.perf_counter() - start) / runs * 1000
+            totals[i] += elapsed
+            row += [elapsed, accuracy(text, expected)]
+        print(f"{name:<16}{row[0]:>10.0f}{row[1]:>9}{row[2]:>10.0f}{row[3]:>9}")
+    print(f"{'total':<16}{totals[0]:>10.0f}{'':>9}{totals[1]:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+
+
+def make_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Disk-backed cache of finished media files, bounded by `max_bytes` with LRU eviction.
+
+    Entries live in `root` as `<key>.<ext>`, so the index is rebuilt from disk on startup:
+    a file's mtime is when it was cached (for `ttl`), its atime when it was last used (for LRU).
+    Attachment IDs are remembered against their content hash, so a repeat of the same
+    attachment can skip the download as well.
+    """
+
+    MAX_ALIASES = 10000
+
+    def __init__(self, root: str, max_bytes: int, ttl: float | None = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (path, size, created)
+        self.aliases = OrderedDict()  # attachment id -> content hash
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(root, exist_ok=True)
+        found = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                found.append((stat.st_atime, name.split(".")[0], path, stat.st_size, stat.st_mtime))
+        for _, key, path, size, created in sorted(found):
+            self.entries[key] = (path, size, created)
+            self.size += size
+        self._evict()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.size
+        }
+
+    def content_hash(self, attachment_id: int) -> str | None:
+        return self.aliases.get(attachment_id)
+
+    def remember(self, attachment_id: int, content_hash: str):
+        self.aliases[attachment_id] = content_hash
+        self.aliases.move_to_end(attachment_id)
+        while len(self.aliases) > self.MAX_ALIASES:
+            self.aliases.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        entry = self.entries.get(key)
+        now = time.time()
+        expired = entry and self.ttl and now - entry[2] > self.ttl
+        if entry and not expired and os.path.exists(entry[0]):
+            self.entries.move_to_end(key)
+            os.utime(entry[0], (now, entry[2]))
+            self.hits += 1
+            return entry[0]
+        if entry:
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, path: str) -> str:
+        """Move `path` into the cache and return its new location."""
+        size = os.path.getsize(path)
+        ext = path.rsplit(".", 1)[-1]
+        target = os.path.join(self.root, f"{key}.{ext}")
+        await asyncio.to_thread(shutil.move, path, target)
+        now = time.time()
+        os.utime(target, (now, now))
+
+        if key in self.entries:
+            self.size -= self.entries[key][1]
+        self.entries[key] = (target, size, now)
+        self.entries.move_to_end(key)
+        self.size += size
+        self._evict()
+        return target
+
+    def _drop(self, key: str):
+        path, size, _ = self.entries.pop(key)
+        self.size -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        # never evict the newest entry, it's about to be sent, even if it's over the budget on its own
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            self._drop(next(iter(self.entries)))
+
+
+class MemoryCache:
+    """In-memory LRU of up to `max_items` values, each expiring `ttl` seconds after it was stored."""
+
+    def __init__(self, max_items: int, ttl: float | None = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, created)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries)
+        }
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry and self.ttl and time.monotonic() - entry[1] > self.ttl:
+            del self.entries[key]
+            entry = None
+        if entry:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one running task."""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key: str, func):
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        # one caller giving up shouldn't cancel the work for everyone else
+        return await asyncio.shield(task)
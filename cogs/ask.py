@@ -1,9 +1,12 @@
 import discord
 from discord import app_commands
 import asyncio
+import time
 import yaml
-import openai
-from collections import defaultdict, deque
+import metrics
+from conversations import ConversationStore
+from router import create_router
+from llm import ThinkFilter, FairScheduler, SchedulerError, ResponseCache, build_messages, estimate_tokens, summarize
 with open("config.yaml", "r") as file:
     config = yaml.safe_load(file)
 from datetime import datetime
@@ -22,14 +25,136 @@ def create_error_embed(title: str, description: str) -> discord.Embed:
 
 system_message = config['openai']['system_message']
 
-openai_client = openai.AsyncOpenAI(
-    api_key=config['openai']['api_key'],
-    base_url=config['openai']['base_url']
+router = create_router(config['openai'])
+ask_config = config.get("ask") or {}
+
+MESSAGE_LIMIT = 2000
+EDIT_INTERVAL = 1.5  # seconds between edits of one message, inside Discord's 5 edits per 5 seconds
+
+
+class StreamingReply:
+    """Shows an answer while it streams in, editing the message at most every EDIT_INTERVAL seconds.
+
+    Past MESSAGE_LIMIT characters the answer continues in a follow-up message instead of being cut.
+    """
+
+    def __init__(self, interaction: discord.Interaction):
+        self.interaction = interaction
+        self.message = None  # the follow-up being written to, None while it's still the original response
+        self.text = ""
+        self.shown = ""
+        self.last_edit = 0.0
+
+    async def edit(self, content: str):
+        if self.message is None:
+            await self.interaction.edit_original_response(content=content)
+        else:
+            await self.message.edit(content=content)
+        self.shown = content
+        self.last_edit = time.monotonic()
+
+    async def add(self, text: str):
+        self.text += text
+        while len(self.text) > MESSAGE_LIMIT:
+            # finish this message at a line break or space, and carry on in a new one
+            cut = self.text.rfind("\n", 0, MESSAGE_LIMIT)
+            if cut < MESSAGE_LIMIT // 2:
+                cut = self.text.rfind(" ", 0, MESSAGE_LIMIT)
+            if cut <= 0:
+                cut = MESSAGE_LIMIT
+            await self.edit(self.text[:cut])
+            self.text = self.text[cut:].lstrip()
+            self.message = await self.interaction.followup.send(self.text[:MESSAGE_LIMIT] or "…", wait=True)
+            self.shown = self.text[:MESSAGE_LIMIT]
+            self.last_edit = time.monotonic()
+
+        if self.text and self.text != self.shown and time.monotonic() - self.last_edit >= EDIT_INTERVAL:
+            await self.edit(self.text)
+
+    async def finish(self):
+        if self.text and self.text != self.shown:
+            await self.edit(self.text)
+
+
+async def stream_answer(reply: StreamingReply, messages: list[dict]) -> str:
+    """Stream the model's answer to `messages` into `reply`, returning the visible part."""
+    think = ThinkFilter(ask_config.get("think_hold", 2000))
+    answer = []
+    start = time.monotonic()
+    prefill = None
+    first_token = None
+    metrics.llm.record("prompt_tokens_estimated", estimate_tokens(messages))
+    async with router.stream(messages=messages, stream_options={"include_usage": True}) as stream:
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                metrics.llm.record("prompt_tokens", chunk.usage.prompt_tokens)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if prefill is None:
+                # the first token of any kind, thinking included, comes right after prompt processing
+                prefill = time.monotonic() - start
+                metrics.llm.record("prefill_seconds", prefill)
+            text = think.feed(chunk.choices[0].delta.content)
+            if text:
+                if first_token is None:
+                    first_token = time.monotonic() - start
+                    metrics.llm.record("first_visible_token_seconds", first_token)
+                answer.append(text)
+                await reply.add(text)
+
+    metrics.llm.record("generation_seconds", time.monotonic() - start)
+    rest = think.flush()
+    final_content = ("".join(answer) + rest).strip()
+    await reply.add(rest if final_content else "*(no answer)*")
+    await reply.finish()
+    return final_content
+
+
+scheduler = FairScheduler(
+    ask_config.get("max_in_flight", 2),
+    ask_config.get("max_queue", 20),
+    max_per_user=ask_config.get("max_queued_per_user", 1),
+    max_wait=ask_config.get("max_wait_minutes", 14) * 60  # interaction tokens expire after 15 minutes
 )
-model = config['openai']['model']
+
+
+async def summarize_history(user_id: int, previous: str | None, messages: list[dict]) -> str:
+    # compaction takes turns with everyone else, as a user of its own per conversation
+    async with scheduler.slot(("summary", user_id)):
+        start = time.monotonic()
+        summary = await summarize(router.complete, previous, messages)
+        metrics.llm.record("summary_seconds", time.monotonic() - start)
+        return summary
+
+
+conversations = ConversationStore(
+    ask_config.get("history_db", "data/conversations.sqlite3"),
+    token_budget=ask_config.get("history_tokens", 1500),
+    max_users=ask_config.get("max_users", 500),
+    idle_ttl=ask_config.get("idle_minutes", 30) * 60,
+    max_age=ask_config.get("history_days", 30) * 86400,
+    summarize=summarize_history if ask_config.get("compact", True) else None,
+    compact_tokens=ask_config.get("compact_tokens", 800),
+    keep_messages=ask_config.get("keep_messages", 4)
+)
+responses = ResponseCache(
+    ask_config.get("response_cache_size", 500),
+    ask_config.get("response_cache_minutes", 60) * 60,
+    ask_config.get("response_cache_threshold", 0.9)
+) if ask_config.get("response_cache", False) else None
+janitor = None
+monitor = None
 
 async def setup(bot):
-    chat_history = defaultdict(lambda: deque(maxlen=8)) # halved by two. 8 = 4 exchanges. Change this if you want the bot to remember more than 4 messages.
+    global janitor, monitor
+    await conversations.open()
+    janitor = asyncio.create_task(conversations.janitor(300))
+    monitor = asyncio.create_task(router.monitor(config['openai'].get("health_interval", 30)))
+    metrics.register("llm_scheduler", scheduler.stats)
+    metrics.register("llm_backends", router.stats)
+    metrics.register("conversations", conversations.stats)
+    if responses:
+        metrics.register("response_cache", responses.stats)
     @app_commands.command(
         name="ask",
         description="Query qwen3:1.7b"
@@ -39,32 +164,59 @@ async def setup(bot):
     async def ask_command(interaction: discord.Interaction, prompt: str):
         await interaction.response.send_message("🧡 Reasoning...")
 
+        task = asyncio.current_task()
+        state = {"queued": False, "started": False}
+
+        async def queue_notice(position: int):
+            if state["started"]:
+                return
+            state["queued"] = True
+            try:
+                await interaction.edit_original_response(content=f"⏳ Queued, position **{position}**")
+            except discord.NotFound:
+                # the message is gone, so is anyone waiting for the answer
+                task.cancel()
+
         try:
             user_id = interaction.user.id
 
-            # add the new user message
-            chat_history[user_id].append({"role": "user", "content": prompt})
+            # the new user message only joins the history once it has been answered
+            question = {"role": "user", "content": prompt}
 
-            # build messages: system prompt + history
-            messages = [
-                {"role": "system", "content": system_message + "Current date and time: " + datetime.now().strftime("%B %d, %Y at %I:%M %p")}
-            ]
-            messages.extend(chat_history[user_id])
+            # a first question may have been answered for someone else already
+            summary, history = await conversations.history(user_id)
+            first_turn = responses and not summary and not history and responses.cacheable(prompt)
+            cached = responses.get(prompt) if first_turn else None
+            if cached:
+                reply = StreamingReply(interaction)
+                await reply.add(cached)
+                await reply.finish()
+                await conversations.append(user_id, question, {"role": "assistant", "content": cached})
+                return
 
-            # query model
-            response = await openai_client.chat.completions.create(
-                model=model,
-                messages=messages
-            )
+            # wait our turn, then stream the answer into the message as it's generated
+            queued_at = time.monotonic()
+            async with scheduler.slot(user_id, queue_notice):
+                state["started"] = True
+                metrics.llm.record("queue_wait_seconds", time.monotonic() - queued_at)
+                if state["queued"]:
+                    await interaction.edit_original_response(content="🧡 Reasoning...")
 
-            ai_response = response.choices[0].message.content
-            final_content = ai_response.split("</think>")[-1].strip() if "</think>" in ai_response else ai_response
+                # build messages from the history as of now rather than when we were queued
+                summary, history = await conversations.history(user_id)
+                messages = build_messages(system_message, summary, history, prompt, datetime.now())
 
-            # save assistant reply in history
-            chat_history[user_id].append({"role": "assistant", "content": final_content})
+                final_content = await stream_answer(StreamingReply(interaction), messages)
 
-            # edit the "reasoning" message with the reply
-            await interaction.edit_original_response(content=final_content[:2000])
+            # save the exchange in history
+            if final_content:
+                await conversations.append(user_id, question, {"role": "assistant", "content": final_content})
+                if first_turn and not summary and not history:
+                    responses.put(prompt, final_content)
+
+        except SchedulerError as e:
+            embed = create_error_embed("Not answered", str(e))
+            await interaction.edit_original_response(content=None, embed=embed)
 
         except Exception as e:
             embed = create_error_embed("Error while calling function", f"```{str(e)}```")
@@ -72,4 +224,14 @@ async def setup(bot):
             print(f"Error in ask command: {e}")
 
             
-    bot.tree.add_command(ask_command)
\ No newline at end of file
+    bot.tree.add_command(ask_command)
+
+async def teardown(bot):
+    metrics.unregister("llm_scheduler", "llm_backends", "conversations", "response_cache")
+    # setup may have failed before starting these
+    if janitor:
+        janitor.cancel()
+    if monitor:
+        monitor.cancel()
+    await conversations.close()
+    await router.close()
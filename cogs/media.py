@@ -1,16 +1,20 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 import random
-import yt_dlp
-import aiohttp
-import aiofiles
 import os
-import tempfile
 import asyncio
-from helper import download_video, generate_filename
-import subprocess
+from helper import generate_filename
+from mediajobs import executor, FFmpegError
+from gif import make_gif, GifTooLarge, DURATION_TRIM
+from cache import ResultCache, make_key, file_hash
+from downloads import Downloader
+from workers import WorkerPool
+from transcode import fit_to_size, CannotFit
+from scratch import Scratch, QuotaExceeded, link_or_copy
+from uploads import create_upload_host, UploadError
+import metrics
 from .KatyaCog import KatyaCog  # import base cog
 # yes im lazy.
 MAX_DISCORD_FILESIZE = 10 * 1024 * 1024  # 10 MB
@@ -29,6 +33,45 @@ class Media(KatyaCog):  # inherit from KatyaCog
         self.togif_ctx.allowed_contexts = app_commands.AppCommandContext(guild=True, dm_channel=True, private_channel=True)
         
         bot.tree.add_command(self.togif_ctx)
+
+        media_config = bot.config.get("media") or {}
+        self.cache = ResultCache(
+            media_config.get("cache_dir", "cache/results"),
+            media_config.get("cache_mb", 512) * 1024 * 1024
+        )
+        self.scratch = Scratch(
+            media_config.get("scratch_dir"),
+            media_config.get("scratch_mb", 4096) * 1024 * 1024,
+            media_config.get("scratch_job_mb", 1024) * 1024 * 1024
+        )
+        self.janitor = None
+        self.download_pool = WorkerPool(
+            "ytdl_worker",
+            media_config.get("download_workers") or min(4, os.cpu_count() or 1),
+            media_config.get("download_queue", 20),
+            media_config.get("download_timeout", 300)
+        )
+        self.downloads = Downloader(
+            self.download_pool,
+            self.scratch,
+            media_config.get("download_cache_dir", "cache/downloads"),
+            media_config.get("download_cache_mb", 2048) * 1024 * 1024,
+            media_config.get("download_ttl", 3600)
+        )
+        self.upload_host = create_upload_host(bot.config.get("upload") or {})
+
+    async def cog_load(self):
+        await self.download_pool.start()
+        self.janitor = asyncio.create_task(self.scratch.janitor(600, 3600))
+        metrics.register("media_executor", executor.stats)
+        metrics.register("download_pool", self.download_pool.stats)
+        metrics.register("result_cache", self.cache.stats)
+
+    async def cog_unload(self):
+        metrics.unregister("media_executor", "download_pool", "result_cache")
+        if self.janitor:  # cog_load may have failed before starting it
+            self.janitor.cancel()
+        await self.download_pool.close()
         
     media = app_commands.Group(
         name="media",
@@ -49,98 +92,159 @@ class Media(KatyaCog):  # inherit from KatyaCog
             return await interaction.response.send_message(embed=embed, ephemeral=True)
             
         await interaction.response.defer()
-        with tempfile.TemporaryDirectory() as tmpdir:
-            input_path = os.path.join(tmpdir, generate_filename(media.filename.split('.')[-1]))
-            palette_path = os.path.join(tmpdir, generate_filename("png"))
-            output_path = os.path.join(tmpdir, generate_filename("gif"))
+        await self.convert_gif(interaction, media)
+
+    def queue_notice(self, interaction: discord.Interaction):
+        async def notify(position: int):
+            await interaction.edit_original_response(content=f"⏳ Queued, position **{position}**")
+        return notify
+
+    def progress_notice(self, interaction: discord.Interaction):
+        async def notify(progress: dict):
+            percent = progress.get("percent")
+            if percent is None:
+                text = f"⚙️ Encoding, frame **{progress.get('frame', 0)}**"
+            else:
+                filled = int(percent // 10)
+                text = f"⚙️ Encoding `{'█' * filled}{'░' * (10 - filled)}` {percent:.0f}%"
+            if progress.get("speed"):
+                text += f" ({progress['speed']:.1f}x)"
+            await interaction.edit_original_response(content=text)
+        return notify
+
+    async def reply(self, interaction: discord.Interaction, *, content=None, embed=None, file=None):
+        # edit the deferred message instead of sending a followup, so a queue notice doesn't linger
+        await interaction.edit_original_response(
+            content=content,
+            embed=embed,
+            attachments=[file] if file else []
+        )
 
+    def cached_by_id(self, media: discord.Attachment, *params) -> str | None:
+        """The cached result for an attachment seen before, found without downloading or any scratch space."""
+        content_hash = self.cache.content_hash(media.id)
+        return self.cache.get(make_key(*params, content_hash)) if content_hash else None
+
+    async def lookup_cached(self, media: discord.Attachment, input_path: str, *params) -> tuple[str, str | None]:
+        """Find a cached result for this attachment and transform.
+
+        Returns the cache key and the cached file, or None after saving the attachment to `input_path`.
+        Attachments seen before are looked up by ID, so a hit skips the download too.
+        """
+        content_hash = self.cache.content_hash(media.id)
+        saved = False
+        if not content_hash:
             await media.save(input_path)
+            content_hash = await asyncio.to_thread(file_hash, input_path)
+            self.cache.remember(media.id, content_hash)
+            saved = True
 
-            scale = 480
-            fps = 15
-            duration_trim = 10
+        key = make_key(*params, content_hash)
+        cached = self.cache.get(key)
+        if not cached and not saved:
+            await media.save(input_path)
+        return key, cached
 
-            palette_cmd = [
-                "ffmpeg", "-y",
-                "-i", input_path,
-                "-t", str(duration_trim),
-                "-vf", f"fps={fps},scale={scale}:-1:flags=bicubic,palettegen",
-                palette_path
-            ]
+    async def convert_gif(self, interaction: discord.Interaction, media: discord.Attachment):
+        params = ("gif", MAX_GIF_SIZE, DURATION_TRIM)
+        cached = self.cached_by_id(media, *params)
+        if cached:
+            return await self.reply(interaction, file=discord.File(cached, filename=generate_filename("gif")))
 
-            try:
-                subprocess.run(palette_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            except subprocess.CalledProcessError as e:
-                embed = self.create_error_embed("GIF Conversion Failed", f"Failed to generate palette:\n```{e.stderr.decode()}```")
-                return await interaction.followup.send(embed=embed)
-
-            def run_gif(scale):
-                gif_cmd = [
-                    "ffmpeg", "-y",
-                    "-i", input_path,
-                    "-i", palette_path,
-                    "-t", str(duration_trim),
-                    "-lavfi", f"fps={fps},scale={scale}:-1:flags=bicubic [x]; [x][1:v] paletteuse=dither=none",
-                    output_path
-                ]
-                subprocess.run(gif_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            # the input, plus an output that's at most MAX_GIF_SIZE
+            with self.scratch.job(media.size + MAX_GIF_SIZE) as tmpdir:
+                input_path = os.path.join(tmpdir, generate_filename(media.filename.split('.')[-1]))
+                output_path = os.path.join(tmpdir, generate_filename("gif"))
 
-            try:
-                run_gif(scale)
-                while os.path.getsize(output_path) > MAX_GIF_SIZE and scale > 64:
-                    scale = max(int(scale * 0.8), 64)
-                    run_gif(scale)
-            except subprocess.CalledProcessError as e:
-                embed = self.create_error_embed("GIF Conversion Failed", f"Failed to convert media:\n```{e.stderr.decode()}```")
-                return await interaction.followup.send(embed=embed)
-
-            await interaction.followup.send(file=discord.File(output_path, filename=os.path.basename(output_path)))
+                # an attachment we haven't seen can still have content we have a result for
+                key, cached = await self.lookup_cached(media, input_path, *params)
+                if cached:
+                    return await self.reply(interaction, file=discord.File(cached, filename=generate_filename("gif")))
+
+                try:
+                    await make_gif(
+                        input_path, output_path, MAX_GIF_SIZE,
+                        on_queued=self.queue_notice(interaction), on_progress=self.progress_notice(interaction)
+                    )
+                except FFmpegError as e:
+                    embed = self.create_error_embed("GIF Conversion Failed", f"Failed to convert media:\n{e.stderr[-1800:]}")
+                    return await self.reply(interaction, embed=embed)
+                except GifTooLarge as e:
+                    embed = self.create_error_embed("GIF Too Large", str(e))
+                    return await self.reply(interaction, embed=embed)
+
+                output_path = await self.cache.put(key, output_path)
+                await self.reply(interaction, file=discord.File(output_path, filename=generate_filename("gif")))
+        except QuotaExceeded as e:
+            embed = self.create_error_embed("Busy", str(e))
+            await self.reply(interaction, embed=embed)
     
     @media.command(name="download", description="Download media from an URL")
+    @app_commands.describe(fit="Re-encode videos over 10MB so they can be sent here instead of linked")
     @app_commands.allowed_installs(guilds=True, users=True)
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
-    async def download(self, interaction: discord.Interaction, url: str):
+    async def download(self, interaction: discord.Interaction, url: str, fit: bool = False):
         await interaction.response.defer(thinking=True)
 
         try:
-            filepath = await download_video(url)
+            filepath = await self.downloads.get(url)
         except Exception as e:
             embed = self.create_error_embed("Download Failed", f"Failed to download: {e}")
-            return await interaction.followup.send(embed=embed)
+            return await self.reply(interaction, embed=embed)
 
-        try:
-            filesize = os.path.getsize(filepath)
-            if filesize <= MAX_DISCORD_FILESIZE:
-                await interaction.followup.send(file=discord.File(filepath, filename=os.path.basename(filepath)))
-            else:
-                async with aiohttp.ClientSession() as session:
-                    async with aiofiles.open(filepath, "rb") as f:
-                        form = aiohttp.FormData()
-                        form.add_field("files[]", await f.read(), filename=os.path.basename(filepath))
-                        async with session.post("https://uguu.se/upload", data=form) as resp:
-                            if resp.status == 200:
-                                result = await resp.json()
-                                files = result.get("files")
-                                if result.get("success") and files and "url" in files[0]:
-                                    future_time = datetime.now(timezone.utc) + timedelta(hours=3)
-                                    unix_ts = int(future_time.timestamp())
-                                    file_url = result["files"][0]["url"]
-                                    await interaction.followup.send(
-                                        f"{file_url}\nExpires: <t:{unix_ts}:R>"
-                                    )
-                                else:
-                                    embed = self.create_error_embed("Upload failed", "Uguu API returned invalid response.")
-                                    return await interaction.followup.send(embed=embed)
-                            else:
-                                embed = self.create_error_embed("Upload failed", f"Uguu API returned status: {resp}")
-                                return await interaction.followup.send(embed=embed)
-        finally:
-            # cleanup files
+        # the file belongs to the download cache, so it's not removed here
+        filename = generate_filename(filepath.rsplit(".", 1)[-1])
+        filesize = os.path.getsize(filepath)
+        if filesize <= MAX_DISCORD_FILESIZE:
+            await self.reply(interaction, file=discord.File(filepath, filename=filename))
+        elif fit:
+            # keyed on the content rather than the URL, the download expires and may come back different
+            try:
+                content_hash = await asyncio.to_thread(file_hash, filepath)
+            except OSError as e:
+                embed = self.create_error_embed("Download Failed", f"Failed to download: {e}")
+                return await self.reply(interaction, embed=embed)
+            key = make_key("fit", content_hash, MAX_DISCORD_FILESIZE)
+            fitted = self.cache.get(key)
+            if not fitted:
+                try:
+                    # the source, if it can't be hardlinked, and the two-pass output
+                    with self.scratch.job(filesize + 2 * MAX_DISCORD_FILESIZE) as workdir:
+                        # the download cache can evict or expire its file while this waits for ffmpeg,
+                        # a link of our own keeps it readable until the job is done
+                        source = os.path.join(workdir, filename)
+                        await asyncio.to_thread(link_or_copy, filepath, source)
+                        fitted = await fit_to_size(
+                            source, workdir, MAX_DISCORD_FILESIZE,
+                            on_queued=self.queue_notice(interaction), on_progress=self.progress_notice(interaction)
+                        )
+                        fitted = await self.cache.put(key, fitted)
+                except OSError as e:
+                    embed = self.create_error_embed("Download Failed", f"Failed to download: {e}")
+                    return await self.reply(interaction, embed=embed)
+                except FFmpegError as e:
+                    embed = self.create_error_embed("FFmpeg error", f"\n{e.stderr[-1900:]}\n")
+                    return await self.reply(interaction, embed=embed)
+                except CannotFit as e:
+                    embed = self.create_error_embed("Too Large", str(e))
+                    return await self.reply(interaction, embed=embed)
+                except QuotaExceeded as e:
+                    embed = self.create_error_embed("Busy", str(e))
+                    return await self.reply(interaction, embed=embed)
+            await self.reply(interaction, file=discord.File(fitted, filename=generate_filename("mp4")))
+        else:
             try:
-                os.remove(filepath)
-                os.rmdir(os.path.dirname(filepath))
-            except Exception:
-                pass
+                file_url = await self.upload_host.upload(self.bot.http_session, filepath, filename)
+            except UploadError as e:
+                embed = self.create_error_embed("Upload failed", str(e))
+                return await self.reply(interaction, embed=embed)
+
+            content = file_url
+            if self.upload_host.expires:
+                unix_ts = int((datetime.now(timezone.utc) + self.upload_host.expires).timestamp())
+                content += f"\nExpires: <t:{unix_ts}:R>"
+            await self.reply(interaction, content=content)
     
     @media.command(name="gif", description="Convert an uploaded image or video to a GIF.")
     @app_commands.allowed_installs(guilds=True, users=True)
@@ -154,53 +258,7 @@ class Media(KatyaCog):  # inherit from KatyaCog
             embed = self.create_error_embed("Invalid File", "Please upload a valid **video** or **image** file.")
             return await interaction.followup.send(embed=embed)
         
-        with tempfile.TemporaryDirectory() as tmpdir:
-            input_path = os.path.join(tmpdir, generate_filename(media.filename.split('.')[-1]))
-            palette_path = os.path.join(tmpdir, generate_filename("png"))
-            output_path = os.path.join(tmpdir, generate_filename("gif"))
-
-            await media.save(input_path)
-
-            scale = 480
-            fps = 15
-            duration_trim = 10  
-
-            palette_cmd = [
-                "ffmpeg", "-y",
-                "-i", input_path,
-                "-t", str(duration_trim),
-                "-vf", f"fps={fps},scale={scale}:-1:flags=bicubic,palettegen",
-                palette_path
-            ]
-
-            try:
-                subprocess.run(palette_cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                embed = self.create_error_embed("GIF Conversion Failed", f"Failed to generate palette: {e}")
-                return await interaction.followup.send(embed=embed)
-
-            gif_cmd = [
-                "ffmpeg", "-y",
-                "-i", input_path,
-                "-i", palette_path,
-                "-t", str(duration_trim),
-                "-lavfi", f"fps={fps},scale={scale}:-1:flags=bicubic [x]; [x][1:v] paletteuse=dither=none",
-                output_path
-            ]
-
-            try:
-                subprocess.run(gif_cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                embed = self.create_error_embed("GIF Conversion Failed", f"Failed to convert media to GIF: {e}")
-                return await interaction.followup.send(embed=embed)
-
-            # loop shrink
-            while os.path.getsize(output_path) > MAX_GIF_SIZE and scale > 64:
-                scale = max(int(scale * 0.8), 64)
-                gif_cmd[7] = f"fps={fps},scale={scale}:-1:flags=bicubic [x]; [x][1:v] paletteuse=dither=none"
-                subprocess.run(gif_cmd, check=True)
-
-            await interaction.followup.send(file=discord.File(output_path, filename=os.path.basename(output_path)))
+        await self.convert_gif(interaction, media)
 
     @media.command(name="worsen", description="Worsen a video's quality")
     @app_commands.allowed_installs(guilds=True, users=True)
@@ -213,17 +271,7 @@ class Media(KatyaCog):  # inherit from KatyaCog
             embed = self.create_error_embed("Invalid File", "Please upload a valid video file.")
             return await interaction.followup.send(embed=embed)
             
-        temp_dir = tempfile.gettempdir()
-        input_path = os.path.join(temp_dir, generate_filename("mp4"))
-        output_path = os.path.join(temp_dir, generate_filename("mp4"))
-
-        # download the video
-        await video.save(input_path)
-
-         # ffmpeg command
-        cmd = [
-            "ffmpeg", "-y", "-hide_banner",
-            "-i", input_path,
+        worsen_args = [
             "-vf", "scale=trunc(iw/2/2)*2:trunc(ih/2/2)*2,fps=15",
             "-c:v", "libx264",
             "-preset", "veryfast",
@@ -231,29 +279,46 @@ class Media(KatyaCog):  # inherit from KatyaCog
             "-c:a", "aac",
             "-b:a", "16k",
             "-af", "volume=5",        # boost audio volume
-            output_path
         ]
 
+        cached = self.cached_by_id(video, "worsen", worsen_args)
+        if cached:
+            return await self.reply(interaction, file=discord.File(cached, filename=generate_filename("mp4")))
+
         try:
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            _, stderr = await process.communicate()
-
-            if process.returncode != 0:
-                embed = self.create_error_embed("FFmpeg error", f"\n{stderr.decode()[:1900]}\n")
-                return await interaction.followup.send(embed=embed)
-
-            # send compressed file back
-            await interaction.followup.send(file=discord.File(output_path, filename=os.path.basename(output_path)))
-
-        finally:
-            # cleanup
-            for path in [input_path, output_path]:
-                try: os.remove(path)
-                except: pass
+            # the output is smaller than the input, so twice the input covers both
+            with self.scratch.job(2 * video.size) as tmpdir:
+                input_path = os.path.join(tmpdir, generate_filename("mp4"))
+                output_path = os.path.join(tmpdir, generate_filename("mp4"))
+
+                # download the video, unless we already have the result
+                key, cached = await self.lookup_cached(video, input_path, "worsen", worsen_args)
+                if cached:
+                    return await self.reply(interaction, file=discord.File(cached, filename=generate_filename("mp4")))
+
+                 # ffmpeg command
+                cmd = [
+                    "ffmpeg", "-y", "-hide_banner",
+                    "-i", input_path,
+                    *worsen_args,
+                    output_path
+                ]
+
+                try:
+                    await executor.run(
+                        cmd, name="worsen",
+                        on_queued=self.queue_notice(interaction), on_progress=self.progress_notice(interaction)
+                    )
+                except FFmpegError as e:
+                    embed = self.create_error_embed("FFmpeg error", f"\n{e.stderr[-1900:]}\n")
+                    return await self.reply(interaction, embed=embed)
+
+                # send compressed file back
+                result_path = await self.cache.put(key, output_path)
+                await self.reply(interaction, file=discord.File(result_path, filename=generate_filename("mp4")))
+        except QuotaExceeded as e:
+            embed = self.create_error_embed("Busy", str(e))
+            await self.reply(interaction, embed=embed)
 
 
 async def setup(bot: commands.Bot):
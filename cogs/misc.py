@@ -1,11 +1,9 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import platform
-import psutil
 from datetime import datetime
-import subprocess
-import cpuinfo
+from sysinfo import SystemSampler, sparkline
+import metrics
 from .KatyaCog import KatyaCog  # import base cog
 
 launch_time = datetime.now()
@@ -13,6 +11,21 @@ launch_time = datetime.now()
 class Misc(KatyaCog):  # inherit from KatyaCog
     def __init__(self, bot):
         super().__init__(bot)
+        sampler_config = bot.config.get("system_metrics") or {}
+        self.sampler = SystemSampler(
+            sampler_config.get("interval", 10),
+            sampler_config.get("history", 60),
+            latency=lambda: self.bot.latency
+        )
+
+    async def cog_load(self):
+        self.sampler.start()
+        metrics.register("system", lambda: self.sampler.latest or {})
+
+    async def cog_unload(self):
+        metrics.unregister("system")
+        await self.sampler.close()
+
     misc = app_commands.Group(name="misc", description="Misc.")
 
     @misc.command(name="ping", description="Check the bot's latency")
@@ -33,37 +46,27 @@ class Misc(KatyaCog):  # inherit from KatyaCog
 
     @misc.command(name="info", description="System info")
     async def info(self, interaction: discord.Interaction):
-        await interaction.response.defer()
         uptime = datetime.now() - launch_time
+        facts = self.sampler.facts
+        sample = self.sampler.latest
+        if sample is None:
+            # only right after startup, before the sampler's first round
+            await self.sampler.sample()
+            sample = self.sampler.latest
 
-        system = platform.system()
-        release = platform.release()
-        version = platform.version()
-        cpu = cpuinfo.get_cpu_info().get("brand_raw", platform.processor())
-        memory = psutil.virtual_memory()
-        memory_usage = f"{memory.used // (1024**2)} MB / {memory.total // (1024**2)} MB"
-        python_version = platform.python_version()
-
-        cpu_usage = f"{psutil.cpu_percent()}% ({psutil.cpu_count()} cores)"
-        disk_usage = psutil.disk_usage('/')
-        disk_usage_str = f"{disk_usage.used // (1024**3)} GB / {disk_usage.total // (1024**3)} GB"
+        memory_usage = f"{sample['ram_used'] // (1024**2)} MB / {sample['ram_total'] // (1024**2)} MB"
+        cpu_usage = f"{sample['cpu']}% ({facts['cores']} cores)"
+        disk_usage_str = f"{sample['disk_used'] // (1024**3)} GB / {sample['disk_total'] // (1024**3)} GB"
         latency = f"{self.bot.latency * 1000:.2f} ms"
-
-        cpufreq = psutil.cpu_freq()
-        cpu_freq = f"{cpufreq.current:.2f} MHz" if cpufreq else "N/A"
+        cpu_freq = f"{sample['cpu_freq']:.2f} MHz" if sample["cpu_freq"] else "N/A"
 
         shard_info = f"{interaction.guild.shard_id if interaction.guild else 0} / {self.bot.shard_count}"
 
         # nvidia specific
-        try:
-            output = subprocess.check_output([
-                'nvidia-smi',
-                '--query-gpu=name,memory.used,memory.total',
-                '--format=csv,noheader,nounits'
-            ]).decode('utf-8')
-            gpu_name, gpu_used, gpu_total = output.strip().split(', ')
-            gpu_info = f"{gpu_name}\n{int(gpu_used)} MB / {int(gpu_total)} MB"
-        except Exception:
+        gpus = self.sampler.gpus
+        if gpus:
+            gpu_info = "\n".join(f"{gpu['name']}\n{gpu['memory_used']} MB / {gpu['memory_total']} MB" for gpu in gpus)
+        else:
             gpu_info = "Not available"
 
         embed = discord.Embed(
@@ -73,20 +76,94 @@ class Misc(KatyaCog):  # inherit from KatyaCog
         )
 
         # Organize fields
-        embed.add_field(name="OS", value=f"{system} {release}\n{version}", inline=False)
-        embed.add_field(name="Python", value=python_version, inline=True)
+        embed.add_field(name="OS", value=facts["os"], inline=False)
+        embed.add_field(name="Python", value=facts["python"], inline=True)
         embed.add_field(name="Uptime", value=str(uptime).split('.')[0], inline=True)
         embed.add_field(name="RAM", value=memory_usage, inline=True)
         embed.add_field(name="CPU", value=cpu_usage, inline=True)
         embed.add_field(name="Disk", value=disk_usage_str, inline=True)
         embed.add_field(name="Latency", value=latency, inline=True)
-        embed.add_field(name="CPU Name", value=cpu, inline=False)
+        embed.add_field(name="CPU Name", value=facts["cpu"], inline=False)
         embed.add_field(name="CPU Freq", value=cpu_freq, inline=True)
         embed.add_field(name="Shard", value=shard_info, inline=True)
         embed.add_field(name="GPU", value=gpu_info, inline=False)
 
+        if len(self.sampler.samples) > 1:
+            minutes = round(len(self.sampler.samples) * self.sampler.interval / 60)
+            trends = self.trends()
+            embed.add_field(name=f"Last {minutes} min", value=f"```{trends}```", inline=False)
+
+        embed.set_footer(text=self.emoji)
+        await interaction.response.send_message(embed=embed)
+
+    def trends(self) -> str:
+        cpu = self.sampler.series("cpu")
+        ram = self.sampler.series("ram_percent")
+        lag = [value * 1000 for value in self.sampler.series("loop_lag")]
+        lines = [
+            f"CPU  {sparkline(cpu, 0, 100)} {cpu[-1]:.0f}%",
+            f"RAM  {sparkline(ram, 0, 100)} {ram[-1]:.0f}%",
+            f"Lag  {sparkline(lag, 0)} {lag[-1]:.0f} ms"
+        ]
+        latency = [value * 1000 for value in self.sampler.series("latency")]
+        if latency:
+            lines.append(f"Ping {sparkline(latency, 0)} {latency[-1]:.0f} ms")
+        gpu = self.sampler.series("gpu_used")
+        if gpu and self.sampler.gpus:
+            lines.append(f"VRAM {sparkline(gpu, 0, sum(g['memory_total'] for g in self.sampler.gpus))} {gpu[-1]} MB")
+        return "\n".join(lines)
+
+    @misc.command(name="stats", description="Command, LLM, media and cache stats (owner only)")
+    async def stats(self, interaction: discord.Interaction):
+        if not await self.bot.is_owner(interaction.user):
+            embed = self.create_error_embed("Not allowed", "Only the bot owner can see these.")
+            return await interaction.response.send_message(embed=embed, ephemeral=True)
+
+        embed = discord.Embed(
+            title="Stats",
+            colour=self.accent,
+            timestamp=datetime.utcnow()
+        )
+
+        commands_summary = sorted(metrics.commands.summary().items(), key=lambda item: -item[1]["count"])[:10]
+        lines = [
+            f"/{name}: {s['count']} ({s['errors']} failed, {s['in_flight']} running) avg {s['avg']:.2f}s p95 ≤{s['p95']:g}s"
+            for name, s in commands_summary
+        ]
+        embed.add_field(name="Commands", value=self.block(lines), inline=False)
+
+        lines = [f"{name}: avg {s['avg']:.2f} p95 {s['p95']:.2f} ({s['count']})" for name, s in metrics.llm.summary().items()]
+        embed.add_field(name="LLM", value=self.block(lines), inline=False)
+
+        lines = [
+            f"{name}: {s['jobs']} jobs ({s['failed']} failed) {s['avg_cpu_seconds']:.1f} CPU s/job {s['avg_speed']:.1f}x"
+            for name, s in metrics.jobs.summary().items()
+        ]
+        embed.add_field(name="Media jobs", value=self.block(lines), inline=False)
+
+        lines = []
+        for name, stats in metrics.collect().items():
+            if name == "system":
+                continue
+            flat = {}
+            for key, value in stats.items():
+                if isinstance(value, dict):
+                    flat.update({f"{key} {k}": v for k, v in value.items()})
+                else:
+                    flat[key] = value
+            lines.append(f"{name}: " + ", ".join(f"{key}={value}" for key, value in flat.items()))
+        embed.add_field(name="Pools & caches", value=self.block(lines), inline=False)
+
         embed.set_footer(text=self.emoji)
-        await interaction.edit_original_response(embed=embed)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @staticmethod
+    def block(lines: list[str]) -> str:
+        """`lines` as a code block within an embed field's 1024 characters."""
+        text = "\n".join(lines) or "Nothing yet"
+        if len(text) > 1000:
+            text = text[:997] + "..."
+        return f"```{text}```"
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Misc(bot))
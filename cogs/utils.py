@@ -1,4 +1,3 @@
-# pip install google-search-results
 import discord
 from discord.ext import commands
 from discord import app_commands
@@ -6,16 +5,77 @@ import random
 from helper import secondsightify, tofullwidth, italicize, italicize_random
 from .KatyaCog import KatyaCog
 import yaml
-from serpapi import GoogleSearch
-from googletrans import Translator
 from PIL import Image, UnidentifiedImageError
-import pytesseract
+from ocr import OCR
+from lens import LensClient, LensError
+from cache import MemoryCache
+from translation import create_translation_service
+from workers import WorkerPool
+import hashlib
 import io
+import os
+from datetime import datetime
 import asyncio
+import metrics
 with open("config.yaml", "r") as file:
     config = yaml.safe_load(file)
 serp_key = config["serp_key"]
 
+PAGE_SIZE = 4000  # embed descriptions hold 4096, minus the code block around the text
+
+
+def paginate(text: str, size: int = PAGE_SIZE) -> list[str]:
+    """Split `text` into pages of at most `size` characters, at line breaks where possible."""
+    pages = []
+    while len(text) > size:
+        cut = text.rfind("\n", 0, size)
+        if cut <= 0:
+            cut = size
+        pages.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    pages.append(text)
+    return pages
+
+
+class Pages(discord.ui.View):
+    """Previous / next buttons over a list of embeds, for whoever ran the command."""
+
+    def __init__(self, pages: list[discord.Embed], owner: discord.abc.User):
+        super().__init__(timeout=300)
+        self.pages = pages
+        self.owner = owner
+        self.index = 0
+        self.message = None
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = self.index == 0
+        self.next.disabled = self.index == len(self.pages) - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner.id
+
+    async def show(self, interaction: discord.Interaction):
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.pages[self.index], view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index -= 1
+        await self.show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index += 1
+        await self.show(interaction)
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
 class Utils(KatyaCog):  # inherit instead of commands.Cog
     def __init__(self, bot: commands.Bot):
         super().__init__(bot)  # initialize base cog
@@ -45,6 +105,63 @@ class Utils(KatyaCog):  # inherit instead of commands.Cog
 
         bot.tree.add_command(self.translate_ctx)
 
+        ocr_config = config.get("ocr") or {}
+        self.ocr_pool = WorkerPool(
+            "ocr_worker",
+            ocr_config.get("workers") or min(4, os.cpu_count() or 1),
+            ocr_config.get("queue", 20),
+            ocr_config.get("timeout", 30)
+        )
+        self.ocr = OCR(self.ocr_pool, ocr_config.get("cache_size", 1000), ocr_config.get("cache_mb", 128) * 1024 * 1024)
+        self.ocr_max_images = ocr_config.get("max_images", 4)
+        self.ocr_max_bytes = ocr_config.get("max_image_mb", 10) * 1024 * 1024
+        self.ocr_max_pixels = ocr_config.get("max_image_pixels", 40_000_000)
+
+        self.translator = create_translation_service(config.get("translate") or {})
+
+        lens_config = config.get("lens") or {}
+        self.lens_client = LensClient(
+            serp_key,
+            lens_config.get("ttl_hours", 24) * 3600,
+            cache_size=lens_config.get("cache_size", 1000),
+            max_concurrent=lens_config.get("max_concurrent", 2),
+            per_user=lens_config.get("per_user", 1),
+            timeout=lens_config.get("timeout", 30)
+        )
+        self.lens_hashes = MemoryCache(10000)  # attachment id -> content hash, so repeats skip the download
+        self.lens_hash_max_bytes = lens_config.get("hash_max_mb", 25) * 1024 * 1024
+
+    async def cog_load(self):
+        await self.ocr_pool.start()
+        metrics.register("ocr_pool", self.ocr_pool.stats)
+        metrics.register("ocr_cache", self.ocr.cache.stats)
+        metrics.register("translation_cache", lambda: {**self.translator.cache.stats(), "skipped": self.translator.skipped})
+        metrics.register("lens_cache", self.lens_client.cache.stats)
+
+    async def cog_unload(self):
+        metrics.unregister("ocr_pool", "ocr_cache", "translation_cache", "lens_cache")
+        await self.ocr_pool.close()
+        await self.translator.close()
+
+    def check_image(self, image: discord.Attachment) -> str | None:
+        """Why `image` can't be OCR'd, judged from its metadata so nothing is downloaded for nothing."""
+        if not image.content_type or not image.content_type.startswith("image/"):
+            return "Not an image."
+        if image.size > self.ocr_max_bytes:
+            return f"Too large ({image.size / 1024 / 1024:.1f}MB, the limit is {self.ocr_max_bytes // 1024 // 1024}MB)."
+        if image.width and image.height and image.width * image.height > self.ocr_max_pixels:
+            return f"Too large ({image.width}x{image.height})."
+        return None
+
+    async def read_image(self, image: discord.Attachment) -> str:
+        image_bytes = await image.read()
+        try:
+            Image.open(io.BytesIO(image_bytes))
+        except UnidentifiedImageError:
+            raise ValueError(f"Unsupported format (`{image.content_type}`), try PNG or JPG.")
+        text = await self.ocr.read(image_bytes)
+        return text.strip() or "No text found in the image."
+
     async def translate(
         self,
         interaction: discord.Interaction,
@@ -58,12 +175,11 @@ class Utils(KatyaCog):  # inherit instead of commands.Cog
             await interaction.response.send_message(embed=embed,ephemeral=True)
             return
         await interaction.response.defer()
-        translator = Translator()
         try:
-            result = await translator.translate(message.content, src="auto", dest="en")
+            text, src = await self.translator.translate(message.content, "en")
             embed = self.create_simple_embed(
-                f"Translated `{result.src}` → `en`",
-                result.text
+                f"Translated `{src}` → `en`",
+                text
             )
             await interaction.followup.send(embed=embed)
         except Exception as e:
@@ -112,13 +228,11 @@ class Utils(KatyaCog):  # inherit instead of commands.Cog
     ):
         await interaction.response.defer()
 
-        translator = Translator()
-        
         try:
-            result = await translator.translate(text, src="auto", dest="en")
+            text, src = await self.translator.translate(text, "en")
             embed = self.create_simple_embed(
-                f"Translated `{result.src}` to `en`",
-                result.text
+                f"Translated `{src}` to `en`",
+                text
             )
             await interaction.followup.send(embed=embed)
 
@@ -130,50 +244,26 @@ class Utils(KatyaCog):  # inherit instead of commands.Cog
     async def readtext(self, interaction: discord.Interaction, image: discord.Attachment):
         await interaction.response.defer()
 
-        # check type early
-        if not image.content_type or not image.content_type.startswith("image/"):
-            embed = self.create_error_embed("Invalid file", "Please upload a valid image file.")
+        # check type and size early
+        problem = self.check_image(image)
+        if problem:
+            embed = self.create_error_embed("Invalid file", problem)
             await interaction.followup.send(embed=embed)
             return
 
         try:
-            # safe load
-            image_bytes = await image.read()
-            try:
-                img = Image.open(io.BytesIO(image_bytes))
-            except UnidentifiedImageError:
-                embed = self.create_error_embed(
-                    "Unsupported format",
-                    f"Sorry, I can’t read this image format (`{image.content_type}`).\n"
-                    "Try converting it to PNG or JPG first."
-                )
-                await interaction.followup.send(embed=embed)
-                return
-
-            # OCR
-            try:
-                text = pytesseract.image_to_string(img)
-                if not text.strip():
-                    text = "No text found in the image."
-                embed = self.create_simple_embed("OCR Result:", text)
-            except Exception as e:
-                embed = self.create_error_embed("OCR Failed", f"Error while reading text: `{e}`")
-
+            text = await self.read_image(image)
+            embed = self.create_simple_embed("OCR Result:", text)
         except Exception as e:
-            embed = self.create_error_embed("Unexpected error", str(e))
+            embed = self.create_error_embed("OCR Failed", f"Error while reading text: `{e}`")
 
         await interaction.followup.send(embed=embed)
 
 
     # context menu
     async def ocr_message(self, interaction: discord.Interaction, message: discord.Message):
-        if not message.attachments:
-            embed = self.create_error_embed("No attachments", "Message has no attachments.")
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            return
-
-        image = message.attachments[0]
-        if not image.content_type or not image.content_type.startswith("image/"):
+        images = [a for a in message.attachments if a.content_type and a.content_type.startswith("image/")]
+        if not images:
             embed = self.create_error_embed(
                 "Not an image",
                 "This message doesn’t contain a valid image attachment."
@@ -183,31 +273,40 @@ class Utils(KatyaCog):  # inherit instead of commands.Cog
 
         await interaction.response.defer()
 
-        try:
-            image_bytes = await image.read()
-            try:
-                img = Image.open(io.BytesIO(image_bytes))
-            except UnidentifiedImageError:
-                embed = self.create_error_embed(
-                    "Unsupported format",
-                    f"I can’t identify this image format (`{image.content_type}`) !  \n"
-                    "Please use PNG or JPG !"
-                )
-                await interaction.followup.send(embed=embed)
-                return
+        skipped = images[self.ocr_max_images:]
+        images = images[:self.ocr_max_images]
 
+        async def read(image: discord.Attachment) -> str:
+            problem = self.check_image(image)
+            if problem:
+                return f"[Skipped: {problem}]"
             try:
-                text = pytesseract.image_to_string(img)
-                if not text.strip():
-                    text = "No text found in the image."
-                embed = self.create_simple_embed("OCR Result:", text)
+                return await self.read_image(image)
             except Exception as e:
-                embed = self.create_error_embed("OCR Failed", f"Error while reading text: `{e}`")
+                return f"[OCR failed: {e}]"
 
-        except Exception as e:
-            embed = self.create_error_embed("Unexpected error", str(e))
+        # the worker pool bounds how many actually run at once
+        texts = await asyncio.gather(*(read(image) for image in images))
 
-        await interaction.followup.send(embed=embed)
+        if len(images) == 1:
+            text = texts[0]
+        else:
+            text = "\n\n".join(f"── {i}. {image.filename} ──\n{t}" for i, (image, t) in enumerate(zip(images, texts), 1))
+        if skipped:
+            text += f"\n\n[{len(skipped)} more image(s) skipped, the limit is {self.ocr_max_images} per message.]"
+
+        chunks = paginate(text)
+        if len(chunks) == 1:
+            await interaction.followup.send(embed=self.create_simple_embed("OCR Result:", text))
+            return
+
+        pages = [
+            self.create_simple_embed(f"OCR Result ({i}/{len(chunks)}):", chunk)
+            for i, chunk in enumerate(chunks, 1)
+        ]
+
+        view = Pages(pages, interaction.user)
+        view.message = await interaction.followup.send(embed=pages[0], view=view)
 
     @utils.command(
         name="lens", 
@@ -215,22 +314,33 @@ class Utils(KatyaCog):  # inherit instead of commands.Cog
     )
     async def lens(self, interaction: discord.Interaction, image: discord.Attachment):
         await interaction.response.defer()  # Allow more time
+
+        # SerpApi fetches the image from its URL, so the OCR size limits don't apply here
+        if not image.content_type or not image.content_type.startswith("image/"):
+            embed = self.create_error_embed("Invalid file", "Not an image.")
+            await interaction.followup.send(embed=embed)
+            return
+
+        try:
+            content_hash = self.lens_hashes.get(image.id)
+            if content_hash is None and image.size > self.lens_hash_max_bytes:
+                # not worth downloading just to hash, only repeats of this attachment share results
+                content_hash = f"attachment-{image.id}"
+            elif content_hash is None:
+                content_hash = hashlib.sha256(await image.read()).hexdigest()
+                self.lens_hashes.put(image.id, content_hash)
+            results = await self.lens_client.search(self.bot.http_session, image.url, content_hash, interaction.user.id)
+        except (LensError, discord.HTTPException) as e:
+            embed = self.create_error_embed("Reverse image search failed", str(e))
+            await interaction.followup.send(embed=embed)
+            return
+
         embed = discord.Embed(
             title="Google Lens Results",
             colour=self.accent,
             timestamp=datetime.now()
         )
         embed.set_footer(text=self.emoji)
-        image_url = image.url
-
-        params = {
-            "engine": "google_lens",
-            "url": image_url,
-            "api_key": serp_key
-        }
-
-        search = GoogleSearch(params)
-        results = search.get_dict()
 
         visual_matches = results.get("visual_matches", [])
         related_content = results.get("related_content", [])
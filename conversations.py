@@ -0,0 +1,227 @@
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from cache import SingleFlight
+from llm import estimate_tokens
+
+
+class ConversationStore:
+    """Per-user /ask history, kept within a token budget and written through to SQLite.
+
+    Only the `max_users` most recently active conversations are held in memory, and those
+    idle for `idle_ttl` seconds are dropped by the janitor; either way they're loaded back
+    from the database on the user's next message. Messages older than `max_age` are deleted
+    from the database as well.
+
+    With a `summarize(user_id, summary, messages)` coroutine, a conversation that grows past
+    `compact_tokens` is compacted in the background: everything but the last `keep_messages`
+    is folded into a running summary, which is sent ahead of the remaining messages. `token_budget` still trims the
+    oldest messages outright if compaction can't keep up.
+    """
+
+    def __init__(self, path: str, token_budget: int, max_users: int, idle_ttl: float, max_age: float,
+                 summarize=None, compact_tokens: int | None = None, keep_messages: int = 4):
+        self.path = path
+        self.token_budget = token_budget
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age
+        self.summarize = summarize
+        self.compact_tokens = compact_tokens or token_budget // 2
+        self.keep_messages = keep_messages
+        self.loaded = OrderedDict()  # user id -> {"messages", "summary", "used"}
+        self.compacting = {}  # user id -> background compaction task
+        self.loading = SingleFlight()  # user id -> load from the database, shared by concurrent misses
+        self.db = None
+        self.lock = asyncio.Lock()  # one connection, one statement at a time
+        self.hits = 0
+        self.misses = 0
+        self.compactions = 0
+
+    async def open(self):
+        def connect():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL with NORMAL sync makes each write-through a cheap append
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id, id)")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    user_id INTEGER PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            db.commit()
+            return db
+
+        self.db = await asyncio.to_thread(connect)
+
+    async def close(self):
+        for task in self.compacting.values():
+            task.cancel()
+        if self.db:
+            async with self.lock:
+                await asyncio.to_thread(self.db.close)
+            self.db = None
+
+    async def _run(self, func, *args):
+        async with self.lock:
+            return await asyncio.to_thread(func, *args)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "compactions": self.compactions,
+            "users_loaded": len(self.loaded),
+            "messages_loaded": sum(len(entry["messages"]) for entry in self.loaded.values())
+        }
+
+    async def _entry(self, user_id: int) -> dict:
+        entry = self.loaded.get(user_id)
+        if entry:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+            def load():
+                cutoff = time.time() - self.max_age
+                rows = self.db.execute(
+                    "SELECT id, role, content FROM messages WHERE user_id = ? AND created > ? ORDER BY id",
+                    (user_id, cutoff)
+                ).fetchall()
+                summary = self.db.execute(
+                    "SELECT content FROM summaries WHERE user_id = ? AND updated > ?",
+                    (user_id, cutoff)
+                ).fetchone()
+                return {
+                    "messages": [{"id": row[0], "role": row[1], "content": row[2]} for row in rows],
+                    "summary": summary[0] if summary else None
+                }
+
+            # two misses for one user must end up with the same dict, or appends to the other are lost
+            entry = await self.loading.do(user_id, lambda: self._run(load))
+
+        entry["used"] = time.monotonic()
+        self.loaded[user_id] = entry
+        self.loaded.move_to_end(user_id)
+        while len(self.loaded) > self.max_users:
+            self.loaded.popitem(last=False)
+        return entry
+
+    async def history(self, user_id: int) -> tuple[str | None, list[dict]]:
+        """The summary of the user's older messages, if any, and their recent messages, oldest first."""
+        entry = await self._entry(user_id)
+        return entry["summary"], [{"role": m["role"], "content": m["content"]} for m in entry["messages"]]
+
+    async def append(self, user_id: int, *new: dict):
+        """Add messages to the user's conversation, then trim or compact it back within budget."""
+        entry = await self._entry(user_id)
+
+        def insert():
+            now = time.time()
+            ids = []
+            for message in new:
+                cursor = self.db.execute(
+                    "INSERT INTO messages (user_id, role, content, created) VALUES (?, ?, ?, ?)",
+                    (user_id, message["role"], message["content"], now)
+                )
+                ids.append(cursor.lastrowid)
+            self.db.commit()
+            return ids
+
+        ids = await self._run(insert)
+        messages = entry["messages"]
+        messages.extend({"id": id, "role": m["role"], "content": m["content"]} for id, m in zip(ids, new))
+
+        dropped = self.trim(messages)
+        if dropped:
+            await self._run(self._delete, dropped)
+
+        if self.summarize and user_id not in self.compacting and estimate_tokens(messages) > self.compact_tokens:
+            task = asyncio.create_task(self._compact(user_id, entry))
+            self.compacting[user_id] = task
+            task.add_done_callback(lambda _: self.compacting.pop(user_id, None))
+
+    def trim(self, messages: list[dict]) -> list[int]:
+        """Drop the oldest messages until the rest fit the token budget, returning their ids.
+
+        The newest exchange is always kept, and history never starts with an assistant reply.
+        """
+        dropped = []
+        while len(messages) > 2 and estimate_tokens(messages) > self.token_budget:
+            dropped.append(messages.pop(0)["id"])
+        while messages and messages[0]["role"] == "assistant":
+            dropped.append(messages.pop(0)["id"])
+        return dropped
+
+    async def _compact(self, user_id: int, entry: dict):
+        messages = entry["messages"]
+        old = messages[:-self.keep_messages] if len(messages) > self.keep_messages else []
+        # the kept part should start with a question, not an answer
+        while old and old[-1]["role"] == "user":
+            old.pop()
+        if not old:
+            return
+
+        try:
+            summary = await self.summarize(user_id, entry["summary"], [{"role": m["role"], "content": m["content"]} for m in old])
+        except Exception as e:
+            print(f"[ERROR] Failed to summarise conversation: {e}")
+            return
+        if not summary:
+            return
+
+        ids = {m["id"] for m in old}
+
+        def save():
+            self.db.execute(
+                "INSERT INTO summaries (user_id, content, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET content = excluded.content, updated = excluded.updated",
+                (user_id, summary, time.time())
+            )
+            self._delete(list(ids))
+
+        await self._run(save)
+        # the conversation may have grown, been trimmed or reloaded meanwhile, only drop what was summarised
+        current = self.loaded.get(user_id)
+        if current:
+            current["messages"] = [m for m in current["messages"] if m["id"] not in ids]
+            current["summary"] = summary
+        self.compactions += 1
+
+    def _delete(self, ids: list[int]):
+        self.db.executemany("DELETE FROM messages WHERE id = ?", [(id,) for id in ids])
+        self.db.commit()
+
+    async def janitor(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for user_id, entry in list(self.loaded.items()):
+                if now - entry["used"] > self.idle_ttl:
+                    del self.loaded[user_id]
+
+            def purge():
+                cutoff = time.time() - self.max_age
+                self.db.execute("DELETE FROM messages WHERE created < ?", (cutoff,))
+                self.db.execute("DELETE FROM summaries WHERE updated < ?", (cutoff,))
+                self.db.commit()
+
+            await self._run(purge)
@@ -0,0 +1,57 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from cache import ResultCache, SingleFlight, make_key
+from scratch import Scratch
+from workers import WorkerPool
+
+# room for separate video and audio downloads plus the merged file, at yt-dlp's 128MB format cap
+DOWNLOAD_RESERVATION = 3 * 128 * 1024 * 1024
+
+# share/tracking parameters that don't change what gets downloaded
+TRACKING_PARAMS = {
+    "si", "s", "t", "feature", "ref", "ref_src", "fbclid", "gclid",
+    "igsh", "igshid", "is_from_webapp", "sender_device", "_r"
+}
+HOST_PREFIXES = ("www.", "m.", "mobile.")
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    return urlunsplit(("https", host, parts.path.rstrip("/"), urlencode(query), ""))
+
+
+class Downloader:
+    """yt-dlp downloads, run in a pool of `ytdl_worker` processes, behind a TTL/size-bounded disk cache.
+
+    Concurrent requests for the same normalized URL share one download, and finished
+    files are served from the cache until they expire. Returned paths belong to the
+    cache, callers must not delete them.
+    """
+
+    def __init__(self, pool: WorkerPool, scratch: Scratch, root: str, max_bytes: int, ttl: float):
+        self.pool = pool
+        self.scratch = scratch
+        self.cache = ResultCache(root, max_bytes, ttl)
+        self.inflight = SingleFlight()
+
+    async def get(self, url: str) -> str:
+        key = make_key("download", normalize_url(url))
+        cached = self.cache.get(key)
+        if cached:
+            return cached
+        return await self.inflight.do(key, lambda: self._fetch(key, url))
+
+    async def _fetch(self, key: str, url: str) -> str:
+        with self.scratch.job(DOWNLOAD_RESERVATION) as tmpdir:
+            result = await self.pool.run({"url": url, "dir": tmpdir})
+            return await self.cache.put(key, result["path"])
@@ -0,0 +1,147 @@
+import math
+import os
+
+from mediajobs import executor, probe
+
+MAX_SCALE = 480
+MIN_SCALE = 64
+DURATION_TRIM = 10
+
+SCALES = (480, 400, 320, 272, 224, 192, 160, 128, 96, 64)
+# (fps, colours) from best looking to cheapest, tried at every scale before going smaller
+STEPS = ((15, 256), (12, 256), (10, 128), (8, 64))
+
+# gif bits per output pixel per frame at 256 colours ~ BASE_BPP + SLOPE_BPP * source bits per pixel.
+# the source bitrate is our motion/complexity estimate: static or flat clips encode to very little.
+BASE_BPP = 1.0
+SLOPE_BPP = 20.0
+DEFAULT_SOURCE_BPP = 0.1
+HEADROOM = 0.9  # aim under the limit so the prediction error rarely needs a second pass
+
+
+class GifTooLarge(Exception):
+    pass
+
+
+def media_info(data: dict) -> dict:
+    """Pull what the size model needs out of an ffprobe result."""
+    stream = (data.get("streams") or [{}])[0]
+    fmt = data.get("format") or {}
+
+    width = int(stream.get("width") or MAX_SCALE)
+    height = int(stream.get("height") or MAX_SCALE)
+
+    try:
+        num, den = stream.get("r_frame_rate", "0/1").split("/")
+        fps = float(num) / float(den)
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+
+    duration = float(stream.get("duration") or fmt.get("duration") or 0)
+    # images and single frame inputs report no usable duration or rate
+    frames = int(stream.get("nb_frames") or 0)
+    still = duration <= 0 or frames == 1 or fps <= 0
+
+    bit_rate = int(stream.get("bit_rate") or fmt.get("bit_rate") or 0)
+    if still or not bit_rate:
+        source_bpp = DEFAULT_SOURCE_BPP
+    else:
+        source_bpp = bit_rate / (width * height * fps)
+
+    return {
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "duration": min(duration, DURATION_TRIM),
+        "still": still,
+        "source_bpp": source_bpp
+    }
+
+
+class SizeModel:
+    """Predicts the output size of a GIF encode and learns a correction factor from real results."""
+
+    def __init__(self):
+        self.correction = 1.0
+
+    def predict(self, info: dict, scale: int, fps: int, colors: int) -> int:
+        out_w = scale
+        out_h = max(1, round(info["height"] * scale / info["width"]))
+        frames = 1 if info["still"] else max(1, info["duration"] * min(fps, info["fps"]))
+
+        bpp = min(8.0, BASE_BPP + SLOPE_BPP * info["source_bpp"])
+        bpp *= math.log2(colors) / 8
+        return int(out_w * out_h * frames * bpp / 8 * self.correction)
+
+    def plan(self, info: dict, limit: int) -> tuple[int, int, int, int]:
+        """Pick the largest scale/fps/colour combination predicted to land under the limit."""
+        budget = limit * HEADROOM
+        top = min(MAX_SCALE, info["width"])
+        scales = [top] + [s for s in SCALES if s < top]
+
+        for scale in scales:
+            for fps, colors in STEPS:
+                predicted = self.predict(info, scale, fps, colors)
+                if predicted <= budget:
+                    return scale, fps, colors, predicted
+
+        fps, colors = STEPS[-1]
+        return scales[-1], fps, colors, self.predict(info, scales[-1], fps, colors)
+
+    def observe(self, predicted: int, actual: int):
+        if predicted <= 0 or actual <= 0:
+            return
+        # moving average in log space so over- and under-shoots weigh the same
+        ratio = actual / predicted
+        log_correction = 0.8 * math.log(self.correction) + 0.2 * math.log(self.correction * ratio)
+        self.correction = min(4.0, max(0.25, math.exp(log_correction)))
+
+
+model = SizeModel()
+
+
+def gif_command(input_path: str, output_path: str, scale: int, fps: int, colors: int) -> list[str]:
+    """One ffmpeg run: decode once, split the frames, build the palette from one branch and apply it to the other.
+
+    palettegen only emits its palette after the last frame, so split buffers the trimmed clip in memory.
+    That's at most DURATION_TRIM seconds at MAX_SCALE, which is cheaper than decoding the source twice.
+    """
+    graph = (
+        f"[0:v]fps={fps},scale={scale}:-1:flags=bicubic,split[a][b];"
+        f"[a]palettegen=max_colors={colors}[p];"
+        f"[b][p]paletteuse=dither=none"
+    )
+    return [
+        "ffmpeg", "-y",
+        "-t", str(DURATION_TRIM),
+        "-i", input_path,
+        "-filter_complex", graph,
+        output_path
+    ]
+
+
+async def make_gif(input_path: str, output_path: str, limit: int, on_queued=None, on_progress=None):
+    """Encode a GIF predicted to fit under `limit` bytes, with at most one corrective pass."""
+    info = media_info(await probe(input_path))
+    scale, fps, colors, predicted = model.plan(info, limit)
+
+    await executor.run(
+        gif_command(input_path, output_path, scale, fps, colors),
+        name="gif", duration=info["duration"] or None, on_queued=on_queued, on_progress=on_progress
+    )
+    actual = os.path.getsize(output_path)
+    print(f"[INFO] GIF {scale}px {fps}fps {colors}c: predicted {predicted // 1024} KB, actual {actual // 1024} KB")
+    model.observe(predicted, actual)
+
+    if actual > limit and scale > MIN_SCALE:
+        # size grows with area, so shrink both sides by the square root of the overshoot
+        scale = max(MIN_SCALE, int(scale * math.sqrt(limit * HEADROOM / actual)))
+        await executor.run(
+            gif_command(input_path, output_path, scale, fps, colors),
+            name="gif", duration=info["duration"] or None, on_queued=on_queued, on_progress=on_progress
+        )
+        actual = os.path.getsize(output_path)
+        print(f"[INFO] GIF corrective pass {scale}px: actual {actual // 1024} KB")
+
+    if actual > limit:
+        raise GifTooLarge(f"The GIF came out at {actual / 1024 / 1024:.1f} MB, over the {limit // 1024 // 1024} MB limit.")
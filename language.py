@@ -0,0 +1,263 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+# Languages with their own script are told apart by it. Latin script text is scored with
+# character 1-3 gram models trained on the samples below when this module is imported.
+SCRIPTS = [
+    # (language, pattern), the first script making up at least half the letters wins
+    ("ko", re.compile(r"[가-힯ᄀ-ᇿ]")),
+    ("zh-cn", re.compile(r"[぀-ヿ一-鿿]")),  # Japanese if there's any kana, see detect()
+    ("ru", re.compile(r"[Ѐ-ӿ]")),  # Ukrainian if there are Ukrainian-only letters
+    ("el", re.compile(r"[Ͱ-Ͽ]")),
+    ("ar", re.compile(r"[؀-ۿ]")),
+    ("iw", re.compile(r"[֐-׿]")),
+    ("hi", re.compile(r"[ऀ-ॿ]")),
+    ("th", re.compile(r"[฀-๿]")),
+]
+KANA = re.compile(r"[぀-ヿ]")
+UKRAINIAN = re.compile(r"[іїєґ]")
+# Scripts only one language is written in, so detecting these is as good as being told. The
+# others are shared (Persian and Urdu use Arabic script, Bulgarian and Serbian Cyrillic, Marathi
+# Devanagari, Cantonese and Traditional Chinese Han) and are only the most likely language.
+OWN_SCRIPT = {"ko", "ja", "el", "th"}
+
+SAMPLES = {
+    "en": """
+        The weather was nice today so we went for a walk in the park and had lunch by the river.
+        I think you should try the new version, it works much better than the old one.
+        Does anyone know how to fix this? I have been trying for hours and nothing works.
+        She said that they would be here at around eight, but they are always late.
+        What are you doing this weekend? We were thinking about going to see a movie.
+        Thanks for the help, that was exactly what I needed. I will let you know if it breaks again.
+        This is probably the best thing that has happened to me all year, honestly.
+        Could you please send me the link when you get a chance? I can't find it anywhere.
+        There is nothing wrong with the server, it just needs to be restarted every few days.
+        lol yeah that's what I was thinking too, it doesn't make any sense to me either.
+    """,
+    "es": """
+        Hoy hizo buen tiempo, así que fuimos a dar un paseo por el parque y comimos junto al río.
+        Creo que deberías probar la nueva versión, funciona mucho mejor que la anterior.
+        ¿Alguien sabe cómo arreglar esto? Llevo horas intentándolo y no funciona nada.
+        Ella dijo que llegarían sobre las ocho, pero siempre llegan tarde.
+        ¿Qué vas a hacer este fin de semana? Estábamos pensando en ir al cine.
+        Gracias por la ayuda, era justo lo que necesitaba. Te aviso si vuelve a fallar.
+        Esto es probablemente lo mejor que me ha pasado en todo el año, de verdad.
+        ¿Me puedes mandar el enlace cuando puedas? No lo encuentro por ningún lado.
+        No pasa nada con el servidor, solo hay que reiniciarlo cada pocos días.
+        jaja sí, eso es lo que yo también pensaba, para mí tampoco tiene sentido.
+    """,
+    "fr": """
+        Il faisait beau aujourd'hui, alors nous sommes allés nous promener dans le parc et avons mangé au bord de la rivière.
+        Je pense que tu devrais essayer la nouvelle version, elle fonctionne beaucoup mieux que l'ancienne.
+        Quelqu'un sait comment réparer ça ? J'essaie depuis des heures et rien ne marche.
+        Elle a dit qu'ils seraient là vers huit heures, mais ils sont toujours en retard.
+        Qu'est-ce que tu fais ce week-end ? On pensait aller voir un film.
+        Merci pour l'aide, c'était exactement ce dont j'avais besoin. Je te dis si ça recommence.
+        C'est sans doute la meilleure chose qui me soit arrivée cette année, franchement.
+        Tu peux m'envoyer le lien quand tu as un moment ? Je ne le trouve nulle part.
+        Il n'y a aucun problème avec le serveur, il faut juste le redémarrer tous les quelques jours.
+        mdr oui c'est ce que je pensais aussi, ça n'a aucun sens pour moi non plus.
+    """,
+    "de": """
+        Heute war schönes Wetter, also sind wir im Park spazieren gegangen und haben am Fluss gegessen.
+        Ich finde, du solltest die neue Version ausprobieren, sie funktioniert viel besser als die alte.
+        Weiß jemand, wie man das repariert? Ich versuche es seit Stunden und nichts funktioniert.
+        Sie hat gesagt, dass sie gegen acht hier sein würden, aber sie kommen immer zu spät.
+        Was machst du am Wochenende? Wir haben überlegt, ins Kino zu gehen.
+        Danke für die Hilfe, das war genau das, was ich gebraucht habe. Ich sage Bescheid, wenn es wieder kaputt ist.
+        Das ist ehrlich gesagt wahrscheinlich das Beste, was mir dieses Jahr passiert ist.
+        Kannst du mir den Link schicken, wenn du Zeit hast? Ich kann ihn nirgendwo finden.
+        Mit dem Server ist alles in Ordnung, er muss nur alle paar Tage neu gestartet werden.
+        haha ja, das habe ich auch gedacht, für mich ergibt das auch keinen Sinn.
+    """,
+    "it": """
+        Oggi faceva bel tempo, quindi siamo andati a fare una passeggiata nel parco e abbiamo pranzato vicino al fiume.
+        Penso che dovresti provare la nuova versione, funziona molto meglio di quella vecchia.
+        Qualcuno sa come sistemare questa cosa? Ci provo da ore e non funziona niente.
+        Ha detto che sarebbero arrivati verso le otto, ma sono sempre in ritardo.
+        Cosa fai questo fine settimana? Stavamo pensando di andare a vedere un film.
+        Grazie per l'aiuto, era proprio quello che mi serviva. Ti faccio sapere se si rompe di nuovo.
+        Questa è probabilmente la cosa più bella che mi sia successa quest'anno, davvero.
+        Mi puoi mandare il link quando hai un attimo? Non riesco a trovarlo da nessuna parte.
+        Il server non ha nessun problema, bisogna solo riavviarlo ogni pochi giorni.
+        ahah sì è quello che pensavo anch'io, neanche per me ha senso.
+    """,
+    "pt": """
+        O tempo estava bom hoje, então fomos dar um passeio no parque e almoçamos perto do rio.
+        Acho que você deveria experimentar a nova versão, ela funciona muito melhor do que a antiga.
+        Alguém sabe como consertar isso? Estou tentando há horas e nada funciona.
+        Ela disse que eles chegariam por volta das oito, mas eles sempre se atrasam.
+        O que você vai fazer neste fim de semana? A gente estava pensando em ir ao cinema.
+        Obrigado pela ajuda, era exatamente o que eu precisava. Eu te aviso se quebrar de novo.
+        Isso é provavelmente a melhor coisa que me aconteceu o ano todo, sinceramente.
+        Você pode me mandar o link quando puder? Não consigo encontrar em lugar nenhum.
+        Não tem nada de errado com o servidor, só precisa ser reiniciado a cada poucos dias.
+        kkkk sim, era isso que eu também estava pensando, pra mim também não faz sentido.
+    """,
+    "nl": """
+        Het was mooi weer vandaag, dus we zijn in het park gaan wandelen en hebben bij de rivier geluncht.
+        Ik denk dat je de nieuwe versie moet proberen, die werkt veel beter dan de oude.
+        Weet iemand hoe je dit kunt oplossen? Ik probeer het al uren en niets werkt.
+        Ze zei dat ze rond acht uur hier zouden zijn, maar ze zijn altijd te laat.
+        Wat ga je dit weekend doen? We dachten erover om naar de film te gaan.
+        Bedankt voor de hulp, dat was precies wat ik nodig had. Ik laat het je weten als het weer kapot gaat.
+        Dit is eerlijk gezegd waarschijnlijk het beste wat me dit jaar is overkomen.
+        Kun je me de link sturen als je tijd hebt? Ik kan hem nergens vinden.
+        Er is niets mis met de server, hij moet alleen om de paar dagen opnieuw worden opgestart.
+        haha ja dat dacht ik ook, voor mij slaat het ook nergens op.
+    """,
+    "pl": """
+        Dzisiaj była ładna pogoda, więc poszliśmy na spacer do parku i zjedliśmy obiad nad rzeką.
+        Myślę, że powinieneś wypróbować nową wersję, działa dużo lepiej niż stara.
+        Czy ktoś wie, jak to naprawić? Próbuję od kilku godzin i nic nie działa.
+        Powiedziała, że będą tu około ósmej, ale oni zawsze się spóźniają.
+        Co robisz w ten weekend? Myśleliśmy, żeby pójść do kina.
+        Dzięki za pomoc, właśnie tego potrzebowałem. Dam ci znać, jeśli znowu się zepsuje.
+        To chyba najlepsza rzecz, jaka mi się przydarzyła w tym roku, naprawdę.
+        Możesz mi wysłać link, jak będziesz miał chwilę? Nigdzie nie mogę go znaleźć.
+        Z serwerem wszystko jest w porządku, trzeba go tylko co kilka dni zrestartować.
+        haha no właśnie też tak myślałem, dla mnie to też nie ma sensu.
+    """,
+    "sv": """
+        Det var fint väder i dag, så vi tog en promenad i parken och åt lunch vid floden.
+        Jag tycker att du ska prova den nya versionen, den fungerar mycket bättre än den gamla.
+        Är det någon som vet hur man fixar det här? Jag har försökt i flera timmar och ingenting fungerar.
+        Hon sa att de skulle vara här runt åtta, men de är alltid sena.
+        Vad ska du göra i helgen? Vi funderade på att gå på bio.
+        Tack för hjälpen, det var precis vad jag behövde. Jag säger till om det går sönder igen.
+        Det här är ärligt talat nog det bästa som har hänt mig i år.
+        Kan du skicka länken när du har tid? Jag hittar den ingenstans.
+        Det är inget fel på servern, den behöver bara startas om med några dagars mellanrum.
+        haha ja det var det jag också tänkte, för mig är det inte heller logiskt.
+    """,
+    "tr": """
+        Bugün hava güzeldi, bu yüzden parkta yürüyüşe çıktık ve nehrin kenarında öğle yemeği yedik.
+        Bence yeni sürümü denemelisin, eskisinden çok daha iyi çalışıyor.
+        Bunu nasıl düzelteceğini bilen var mı? Saatlerdir uğraşıyorum ve hiçbir şey işe yaramıyor.
+        Sekiz civarında burada olacaklarını söyledi ama her zaman geç kalıyorlar.
+        Bu hafta sonu ne yapıyorsun? Sinemaya gitmeyi düşünüyorduk.
+        Yardımın için teşekkürler, tam da ihtiyacım olan şeydi. Tekrar bozulursa sana haber veririm.
+        Bu muhtemelen bu yıl başıma gelen en güzel şey, gerçekten.
+        Fırsatın olduğunda bana linki gönderebilir misin? Hiçbir yerde bulamıyorum.
+        Sunucuda bir sorun yok, sadece birkaç günde bir yeniden başlatılması gerekiyor.
+        haha evet ben de öyle düşünüyordum, bana da hiç mantıklı gelmiyor.
+    """,
+    "id": """
+        Cuaca hari ini bagus, jadi kami jalan-jalan di taman dan makan siang di pinggir sungai.
+        Menurutku kamu harus mencoba versi yang baru, jauh lebih bagus daripada yang lama.
+        Ada yang tahu cara memperbaiki ini? Aku sudah mencoba berjam-jam dan tidak ada yang berhasil.
+        Dia bilang mereka akan sampai sekitar jam delapan, tapi mereka selalu terlambat.
+        Kamu mau ngapain akhir pekan ini? Kami sedang berpikir untuk pergi menonton film.
+        Terima kasih atas bantuannya, itu persis yang aku butuhkan. Nanti aku kabari kalau rusak lagi.
+        Ini mungkin hal terbaik yang terjadi padaku sepanjang tahun ini, jujur saja.
+        Bisa kirim tautannya kalau sempat? Aku tidak bisa menemukannya di mana pun.
+        Tidak ada masalah dengan servernya, hanya perlu dimulai ulang setiap beberapa hari.
+        wkwk iya itu juga yang aku pikirkan, menurutku juga tidak masuk akal.
+    """,
+    "vi": """
+        Hôm nay trời đẹp nên chúng tôi đi dạo trong công viên và ăn trưa bên bờ sông.
+        Tôi nghĩ bạn nên thử phiên bản mới, nó chạy tốt hơn bản cũ rất nhiều.
+        Có ai biết cách sửa cái này không? Tôi đã thử mấy tiếng rồi mà không được gì cả.
+        Cô ấy nói họ sẽ đến khoảng tám giờ, nhưng họ lúc nào cũng đến muộn.
+        Cuối tuần này bạn định làm gì? Chúng tôi đang nghĩ đến việc đi xem phim.
+        Cảm ơn bạn đã giúp, đó đúng là thứ tôi cần. Nếu nó lại hỏng thì tôi sẽ báo bạn.
+        Đây có lẽ là điều tuyệt vời nhất xảy ra với tôi trong năm nay, thật đấy.
+        Bạn gửi cho tôi đường link khi rảnh được không? Tôi tìm mãi không thấy.
+        Máy chủ không có vấn đề gì cả, chỉ cần khởi động lại vài ngày một lần.
+        haha đúng rồi tôi cũng nghĩ vậy, với tôi chuyện đó cũng chẳng có lý gì.
+    """,
+}
+
+MIN_LETTERS = 12  # shorter text is too ambiguous to call
+MIN_MARGIN = 0.1  # how far ahead of the runner-up (log-probability per gram) the winner must be
+# Share of the text's 3-grams the winner has seen. Languages without a model (Welsh, Tagalog,
+# Swahili...) still have a closest model, but it knows few of their 3-grams.
+MIN_SEEN = 0.4
+
+LATIN = re.compile(r"[a-zß-ɏḀ-ỿ]")
+NOISE = re.compile(r"https?://\S+|<a?:\w+:\d+>|<[@#][!&]?\d+>|```.*?```|`[^`]*`", re.S)
+
+
+def clean(text: str) -> str:
+    """Lowercase words separated by single spaces, without links, mentions, custom emoji or code."""
+    text = NOISE.sub(" ", text).lower()
+    # letters and combining marks (Devanagari and Thai vowel signs) stay, everything else splits words
+    return " ".join("".join(c if c.isalpha() or c == "'" or unicodedata.category(c).startswith("M") else " " for c in text).split())
+
+
+def grams(text: str):
+    padded = f" {text} "
+    for n in (1, 2, 3):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            if gram != " " and "  " not in gram:
+                yield gram
+
+
+def train(samples: dict[str, str]) -> dict[str, tuple[dict[str, float], float]]:
+    """Per language, log P(gram) with add-one smoothing, plus the log-probability of an unseen gram."""
+    vocabulary = set()
+    counts = {}
+    for language, sample in samples.items():
+        counts[language] = Counter(grams(clean(sample)))
+        vocabulary.update(counts[language])
+
+    models = {}
+    for language, counter in counts.items():
+        total = sum(counter.values()) + len(vocabulary) + 1
+        models[language] = (
+            {gram: math.log((count + 1) / total) for gram, count in counter.items()},
+            math.log(1 / total)
+        )
+    return models
+
+
+MODELS = train(SAMPLES)
+
+
+def scores(text: str) -> dict[str, float]:
+    """Average log-probability per gram of `text` under each Latin script model."""
+    found = list(grams(text))
+    if not found:
+        return {}
+    result = {}
+    for language, (model, unseen) in MODELS.items():
+        result[language] = sum(model.get(gram, unseen) for gram in found) / len(found)
+    return result
+
+
+def seen(text: str, language: str) -> float:
+    """Share of the 3-grams in `text` that appear in the samples for `language`."""
+    model, _ = MODELS[language]
+    found = [gram for gram in grams(text) if len(gram) == 3]
+    if not found:
+        return 0.0
+    return sum(gram in model for gram in found) / len(found)
+
+
+def detect(text: str) -> str | None:
+    """The language code of `text` as googletrans spells it, or None if it isn't clear."""
+    text = clean(text)
+    letters = sum(c.isalpha() for c in text)
+    if letters < MIN_LETTERS:
+        return None
+
+    for language, pattern in SCRIPTS:
+        if len(pattern.findall(text)) * 2 >= letters:
+            if language == "zh-cn" and KANA.search(text):
+                return "ja"
+            if language == "ru" and UKRAINIAN.search(text):
+                return "uk"
+            return language
+
+    if len(LATIN.findall(text)) < letters * 0.9:
+        return None  # some other script we have no model for
+
+    ranked = sorted(scores(text).items(), key=lambda item: item[1], reverse=True)
+    if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < MIN_MARGIN:
+        return None
+    if seen(text, ranked[0][0]) < MIN_SEEN:
+        return None  # closest of the models, but probably a language none of them cover
+    return ranked[0][0]
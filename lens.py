@@ -0,0 +1,66 @@
+import asyncio
+from collections import defaultdict
+
+import aiohttp
+
+from cache import MemoryCache, SingleFlight
+
+SEARCH_URL = "https://serpapi.com/search.json"
+
+
+class LensError(Exception):
+    pass
+
+
+class LensClient:
+    """Google Lens reverse image search through SerpApi, on the bot's shared HTTP session.
+
+    Every search costs quota, so results are cached by image content hash for `ttl` seconds
+    and identical searches in flight share one request. At most `max_concurrent` searches
+    run at once, and each user may only have `per_user` of them going.
+    """
+
+    def __init__(self, api_key: str, ttl: float, cache_size: int = 1000, max_concurrent: int = 2, per_user: int = 1, timeout: float = 30):
+        self.api_key = api_key
+        self.cache = MemoryCache(cache_size, ttl)
+        self.flights = SingleFlight()
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.per_user = per_user
+        self.running = defaultdict(int)  # user id -> searches in flight
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def search(self, session: aiohttp.ClientSession, image_url: str, content_hash: str, user_id: int) -> dict:
+        """Lens results for the image at `image_url`, whose content hashes to `content_hash`."""
+        cached = self.cache.get(content_hash)
+        if cached is not None:
+            return cached
+
+        if self.running[user_id] >= self.per_user:
+            raise LensError("You already have a search running, wait for it to finish.")
+        self.running[user_id] += 1
+        try:
+            return await self.flights.do(content_hash, lambda: self._fetch(session, image_url, content_hash))
+        finally:
+            self.running[user_id] -= 1
+            if not self.running[user_id]:
+                del self.running[user_id]
+
+    async def _fetch(self, session: aiohttp.ClientSession, image_url: str, content_hash: str) -> dict:
+        params = {
+            "engine": "google_lens",
+            "url": image_url,
+            "api_key": self.api_key
+        }
+        async with self.slots:
+            try:
+                async with session.get(SEARCH_URL, params=params, timeout=self.timeout) as resp:
+                    results = await resp.json(content_type=None)
+            except asyncio.TimeoutError:
+                raise LensError("The search timed out.")
+            except (aiohttp.ClientError, ValueError) as e:
+                raise LensError(f"Search request failed: {e}")
+
+        if resp.status != 200 or "error" in results:
+            raise LensError(results.get("error") or f"Search returned status {resp.status}.")
+        self.cache.put(content_hash, results)
+        return results
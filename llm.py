@@ -0,0 +1,311 @@
+import asyncio
+import math
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from slots import SlotQueue, Waiter
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+THINK_HOLD = 2000  # characters held back waiting for a closing tag when the reply didn't open with one
+
+CHARS_PER_TOKEN = 3.5  # rough average for chat text with Qwen-style tokenizers
+MESSAGE_OVERHEAD = 4  # role and chat template tokens around each message
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Approximate prompt tokens for `messages`, close enough for budgeting without a tokenizer."""
+    return sum(int(len(m["content"]) / CHARS_PER_TOKEN) + MESSAGE_OVERHEAD for m in messages)
+
+
+def build_messages(system: str, summary: str | None, history: list[dict], prompt: str, now: datetime) -> list[dict]:
+    """The prompt for one request, with whatever changes between requests as late as possible.
+
+    Local servers reuse their KV cache for the longest unchanged prefix of a prompt. The date,
+    which changes every minute, rides along with the new question instead of sitting in the
+    system prompt, so the system prompt and the history after it are reused from request to
+    request. The summary only changes when the conversation is compacted.
+    """
+    if summary:
+        system += "\n\nNotes from earlier in this conversation: " + summary
+    return [
+        {"role": "system", "content": system},
+        *history,
+        {"role": "user", "content": f"[Current date and time: {now:%B %d, %Y at %I:%M %p}]\n{prompt}"}
+    ]
+
+
+SUMMARY_TOKENS = 300  # summaries are cut to about this long, so they can't grow with every compaction
+SUMMARY_PROMPT = (
+    "Summarise the conversation below between a user and you, the assistant, as short notes for yourself, "
+    "in at most 150 words. "
+    "Keep names, facts, preferences, open questions and anything the user asked you to remember. "
+    "Leave out greetings and small talk. Reply with the notes only. /no_think"
+)
+
+
+async def summarize(complete, previous: str | None, messages: list[dict]) -> str:
+    """Fold `messages` into the `previous` summary with one short, non-streamed `complete(messages=...)`."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    if previous:
+        transcript = f"Notes so far: {previous}\n\n{transcript}"
+    response = await complete(
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": transcript}
+        ]
+    )
+    think = ThinkFilter()
+    summary = (think.feed(response.choices[0].message.content or "") + think.flush()).strip()
+    return summary[:int(SUMMARY_TOKENS * CHARS_PER_TOKEN)]
+
+
+class ThinkFilter:
+    """Strips the <think>...</think> block from the start of a streamed reply, chunk by chunk.
+
+    Some chat templates open the block in the prompt, so the reply only has the closing tag.
+    Until either tag shows up, up to `hold` characters are held back, then the reply is taken
+    to have no think block and passed through as it comes. A closing tag with no opening one
+    drops everything before it. Text that could still turn out to be part of a tag is held
+    back until the next chunk.
+    """
+
+    def __init__(self, hold: int = THINK_HOLD):
+        self.hold = hold
+        self.buffer = ""
+        self.state = "start"  # start -> thinking -> answer, or start -> answer
+        self.leading = True  # drop whitespace before the answer
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of the reply and return whatever part of it can be shown now."""
+        self.buffer += chunk
+
+        if self.state == "start":
+            stripped = self.buffer.lstrip()
+            end = self.buffer.find(THINK_CLOSE)
+            if stripped.startswith(THINK_OPEN):
+                self.state = "thinking"
+                self.buffer = stripped[len(THINK_OPEN):]
+            elif end != -1:
+                # the block was opened in the prompt, everything so far was reasoning
+                self.state = "answer"
+                self.buffer = self.buffer[end + len(THINK_CLOSE):]
+            elif len(self.buffer) < self.hold or THINK_OPEN.startswith(stripped):
+                return ""
+            else:
+                self.state = "answer"
+
+        if self.state == "thinking":
+            end = self.buffer.find(THINK_CLOSE)
+            if end == -1:
+                # keep just enough to spot a closing tag split across chunks
+                self.buffer = self.buffer[-(len(THINK_CLOSE) - 1):]
+                return ""
+            self.state = "answer"
+            self.buffer = self.buffer[end + len(THINK_CLOSE):]
+
+        if self.leading:
+            self.buffer = self.buffer.lstrip()
+            if not self.buffer:
+                return ""
+            self.leading = False
+
+        text, self.buffer = self.buffer, ""
+        return text
+
+    def flush(self) -> str:
+        """Whatever is still held back once the reply has ended.
+
+        A reply that ended without either tag was all answer, an unfinished think block stays hidden.
+        """
+        text, self.buffer = self.buffer, ""
+        if self.state == "thinking":
+            return ""
+        return text.strip() if self.leading else text
+
+    @property
+    def thinking(self) -> bool:
+        return self.state != "answer"
+
+
+class ResponseCache:
+    """Answers to first-turn questions for `ttl` seconds, LRU bounded to `max_items`.
+
+    Questions match exactly after normalising case, spacing and punctuation, or when their
+    character trigram vectors are at least `threshold` cosine-similar and mention the same
+    numbers ("what is 2+2" is not "what is 2+3"). Questions about the current time, news and
+    the like are never cached.
+    """
+
+    VOLATILE = re.compile(r"\b(today|tonight|tomorrow|yesterday|now|time|date|day|week|month|year|latest|current|recent|news|weather)\b")
+
+    def __init__(self, max_items: int, ttl: float, threshold: float = 0.9):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.threshold = threshold
+        self.entries = OrderedDict()  # normalised question -> (vector, norm, numbers, answer, created)
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        return " ".join(re.sub(r"[^\w\s]", " ", prompt.lower()).split())
+
+    @staticmethod
+    def vectorize(text: str) -> tuple[Counter, float]:
+        padded = f" {text} "
+        vector = Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+        return vector, math.sqrt(sum(count * count for count in vector.values()))
+
+    def cacheable(self, prompt: str) -> bool:
+        return not self.VOLATILE.search(prompt.lower())
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "entries": len(self.entries)
+        }
+
+    def get(self, prompt: str) -> str | None:
+        now = time.monotonic()
+        for key in [key for key, entry in self.entries.items() if now - entry[4] > self.ttl]:
+            del self.entries[key]
+
+        text = self.normalize(prompt)
+        entry = self.entries.get(text)
+        if entry:
+            self.entries.move_to_end(text)
+            self.hits += 1
+            return entry[3]
+
+        vector, norm = self.vectorize(text)
+        numbers = re.findall(r"\d+", text)
+        best, best_key = self.threshold, None
+        for key, (other, other_norm, other_numbers, _, _) in self.entries.items():
+            if other_numbers != numbers or not norm or not other_norm:
+                continue
+            similarity = sum(count * other[gram] for gram, count in vector.items()) / (norm * other_norm)
+            if similarity >= best:
+                best, best_key = similarity, key
+        if best_key:
+            self.entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return self.entries[best_key][3]
+        self.misses += 1
+        return None
+
+    def put(self, prompt: str, answer: str):
+        text = self.normalize(prompt)
+        vector, norm = self.vectorize(text)
+        self.entries[text] = (vector, norm, re.findall(r"\d+", text), answer, time.monotonic())
+        self.entries.move_to_end(text)
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
+
+
+class SchedulerError(Exception):
+    pass
+
+
+class FairScheduler(SlotQueue):
+    """Admission control for the LLM backend: at most `max_in_flight` generations at once.
+
+    The rest wait in per-user queues served round-robin, so one user sending prompt after
+    prompt can't starve everyone else. A user's newest request supersedes their oldest once
+    they have `max_per_user` waiting, and a request still waiting after `max_wait` seconds
+    is dropped. Past `max_queue` waiting in total, new requests fail straight away.
+    `on_queued` is awaited with a request's queue position whenever it changes.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, max_per_user: int = 1, max_wait: float | None = None):
+        super().__init__(max_in_flight)
+        self.max_queue = max_queue
+        self.max_per_user = max(1, max_per_user)
+        self.max_wait = max_wait
+        self.queues = OrderedDict()  # user id -> deque of waiters, in serving order
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_running,
+            "running": self.running,
+            "queued": self.queued,
+            "users_queued": len(self.queues)
+        }
+
+    def _push(self, waiter: Waiter):
+        self.queues.setdefault(waiter.key, deque()).append(waiter)
+
+    def _pop(self) -> Waiter | None:
+        if not self.queues:
+            return None
+        user_id, queue = next(iter(self.queues.items()))
+        waiter = queue.popleft()
+        # served once, so to the back of the rotation
+        if queue:
+            self.queues.move_to_end(user_id)
+        else:
+            del self.queues[user_id]
+        return waiter
+
+    def _discard(self, waiter: Waiter) -> bool:
+        queue = self.queues.get(waiter.key)
+        if not queue or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        if not queue:
+            del self.queues[waiter.key]
+        return True
+
+    def _order(self) -> list[Waiter]:
+        """Everyone's first request, then everyone's second..."""
+        order = []
+        queues = list(self.queues.values())
+        depth = 0
+        while True:
+            layer = [queue[depth] for queue in queues if len(queue) > depth]
+            if not layer:
+                return order
+            order.extend(layer)
+            depth += 1
+
+    async def _acquire(self, user_id: int, on_queued=None):
+        if self._try_acquire():
+            return
+
+        # superseding makes room, so it goes before the check for a full queue
+        queue = self.queues.get(user_id)
+        if queue and len(queue) >= self.max_per_user:
+            self._fail(queue[0], SchedulerError("Skipped, you asked something newer."))
+        if self.queued >= self.max_queue:
+            raise SchedulerError("Too many questions are waiting right now, try again in a bit.")
+
+        waiter = Waiter(on_queued, user_id)
+        timer = None
+        if self.max_wait:
+            timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self._fail, waiter, SchedulerError("Waited too long for a free slot, try again in a bit.")
+            )
+        try:
+            await self._wait(waiter)
+        finally:
+            if timer:
+                timer.cancel()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, on_queued=None):
+        """Hold one of the generation slots, waiting in `user_id`'s queue for it if needed."""
+        await self._acquire(user_id, on_queued)
+        try:
+            yield
+        finally:
+            self._release()
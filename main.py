@@ -3,6 +3,8 @@ from discord.ext import commands
 from discord import app_commands
 import yaml
 import os
+import aiohttp
+import metrics
 
 with open("config.yaml", "r", encoding="utf-8") as f:
     config = yaml.safe_load(f)
@@ -10,11 +12,29 @@ with open("config.yaml", "r", encoding="utf-8") as f:
 intents = discord.Intents.default()
 intents.message_content = True
 
+class KatyaTree(app_commands.CommandTree):
+    """The command tree, timing every app command for metrics.commands."""
+
+    async def _call(self, interaction: discord.Interaction):
+        if interaction.type is not discord.InteractionType.application_command:
+            return await super()._call(interaction)  # autocomplete isn't a command run
+
+        command = interaction.command
+        metrics.commands.start(interaction.id, command.qualified_name if command else "unknown")
+        ok = False
+        try:
+            await super()._call(interaction)
+            ok = not interaction.command_failed
+        finally:
+            # also when the callback is cancelled, which skips both on_error and the completion event
+            metrics.commands.finish(interaction.id, ok=ok)
+
 class Katya(commands.Bot):
     def __init__(self, *args, **kwargs):
         # fix contexts /make the bot usable everywhere .
         super().__init__(
             *args,
+            tree_cls=KatyaTree,
             allowed_installs=app_commands.AppInstallationType(
                 guild=True, user=True
             ),
@@ -25,6 +45,21 @@ class Katya(commands.Bot):
         )
 
     async def setup_hook(self):
+        # one pooled http client for every cog, instead of a session per request
+        self.http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.config.get("http_connections", 100))
+        )
+
+        metrics_config = self.config.get("metrics") or {}
+        self.metrics_server = None
+        if metrics_config.get("port"):
+            host = metrics_config.get("host", "127.0.0.1")
+            try:
+                self.metrics_server = await metrics.serve(host, metrics_config["port"])
+                print(f"[INFO] Serving metrics on http://{host}:{metrics_config['port']}/metrics")
+            except OSError as e:
+                print(f"[ERROR] Failed to serve metrics: {e}")
+
         for filename in os.listdir("./cogs"):
             if filename.endswith(".py") and filename != "__init__.py" and not filename.startswith("KatyaCog"):
                 cog_name = f"cogs.{filename[:-3]}"
@@ -42,6 +77,13 @@ class Katya(commands.Bot):
         except Exception as e:
             print(f"[ERROR] Failed to sync: {e}")
             
+    async def close(self):
+        await super().close()
+        if getattr(self, "http_session", None):
+            await self.http_session.close()
+        if getattr(self, "metrics_server", None):
+            await self.metrics_server.cleanup()
+
     async def on_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
         raw_color = self.config.get("accent", "#ff8040")
         color = int(raw_color.lstrip("#"), 16) if isinstance(raw_color, str) else int(raw_color)
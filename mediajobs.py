@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import deque
+
+import psutil
+
+from helper import config
+from slots import SlotQueue, Waiter
+import metrics
+
+media_config = config.get("media") or {}
+
+PROGRESS_INTERVAL = 2  # seconds between progress callbacks, keeps interaction edits under the rate limit
+STDERR_LINES = 100
+DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class FFmpegError(Exception):
+    def __init__(self, returncode: int, stderr: str):
+        lines = stderr.strip().splitlines()
+        super().__init__(lines[-1] if lines else f"ffmpeg exited with code {returncode}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class MediaExecutor(SlotQueue):
+    """Runs ffmpeg jobs as async subprocesses, at most `max_jobs` at a time.
+
+    Jobs over the limit wait in a FIFO queue. `on_queued` is awaited with the
+    job's queue position whenever it changes, and `on_progress` with ffmpeg's
+    progress at most every PROGRESS_INTERVAL seconds, so commands can show both.
+    """
+
+    def __init__(self, max_jobs: int):
+        super().__init__(max_jobs)
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        return {
+            "max_jobs": self.max_running,
+            "running": self.running,
+            "queued": self.queued
+        }
+
+    def _push(self, waiter: Waiter):
+        self._waiters.append(waiter)
+
+    def _pop(self) -> Waiter | None:
+        return self._waiters.popleft() if self._waiters else None
+
+    def _discard(self, waiter: Waiter) -> bool:
+        if waiter not in self._waiters:
+            return False
+        self._waiters.remove(waiter)
+        return True
+
+    def _order(self) -> list[Waiter]:
+        return list(self._waiters)
+
+    async def _acquire(self, on_queued=None):
+        if not self._try_acquire():
+            await self._wait(Waiter(on_queued))
+
+    async def run(self, args: list[str], *, name: str = "ffmpeg", duration: float | None = None, on_queued=None, on_progress=None):
+        """Run an ffmpeg command once a slot is free. Raises FFmpegError on a non-zero exit.
+
+        ffmpeg reports progress on stdout (`-progress pipe:1`). Only the tail of stderr is kept.
+        `duration` is the length of media this run will output, read from ffmpeg's banner if not given.
+        The run is recorded in metrics.jobs under `name`.
+        """
+        queued_at = time.monotonic()
+        await self._acquire(on_queued)
+        try:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                args[0], "-progress", "pipe:1", "-nostats", *args[1:],
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stderr = deque(maxlen=STDERR_LINES)
+            progress = {"duration": duration, "cpu": 0.0, "total_size": 0}
+            reports = []
+
+            async def read_stderr():
+                async for line in process.stderr:
+                    line = line.decode(errors="replace")
+                    stderr.append(line)
+                    match = progress["duration"] is None and DURATION_RE.search(line)
+                    if match:
+                        h, m, sec = match.groups()
+                        progress["duration"] = int(h) * 3600 + int(m) * 60 + float(sec)
+
+            stderr_task = asyncio.create_task(read_stderr())
+            try:
+                await self._read_progress(process, progress, on_progress, reports)
+                await stderr_task
+                await process.wait()
+                if reports:
+                    # let the last progress edit land before the caller sends its result over it
+                    await asyncio.wait(reports[-1:], timeout=5)
+            except BaseException:
+                # cancelled or anything else, ffmpeg mustn't outlive its slot
+                stderr_task.cancel()
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+                raise
+
+            ok = process.returncode == 0
+            metrics.jobs.record(
+                name,
+                ok=ok,
+                input_duration=progress.get("out_time", 0.0),
+                wall=time.monotonic() - started,
+                cpu=progress["cpu"],
+                output_bytes=progress["total_size"],
+                wait=started - queued_at
+            )
+            if not ok:
+                raise FFmpegError(process.returncode, "".join(stderr))
+        finally:
+            self._release()
+
+    async def _read_progress(self, process, progress: dict, on_progress, reports: list):
+        try:
+            ps = psutil.Process(process.pid)
+        except psutil.Error:
+            ps = None
+        last_report = 0.0
+
+        # blocks of key=value lines, each ending with progress=continue or progress=end
+        async for line in process.stdout:
+            key, _, value = line.decode(errors="replace").strip().partition("=")
+            if key == "frame" and value.isdigit():
+                progress["frame"] = int(value)
+            elif key == "speed" and value.endswith("x"):
+                try:
+                    progress["speed"] = float(value[:-1])
+                except ValueError:
+                    pass
+            elif key == "out_time_us" and value.isdigit():
+                progress["out_time"] = int(value) / 1_000_000
+            elif key == "total_size" and value.isdigit():
+                progress["total_size"] = int(value)
+            elif key == "progress":
+                if ps:
+                    # sampled while ffmpeg is still alive, the last block comes right before it exits
+                    try:
+                        times = ps.cpu_times()
+                        progress["cpu"] = times.user + times.system
+                    except psutil.Error:
+                        pass
+                now = time.monotonic()
+                if on_progress and value == "continue" and now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    if progress["duration"] and "out_time" in progress:
+                        progress["percent"] = min(100.0, progress["out_time"] / progress["duration"] * 100)
+                    reports[:] = [self._notify(on_progress, dict(progress))]
+
+
+async def probe(path: str, streams: str | None = "v:0") -> dict:
+    """ffprobe a file and return its format and streams (the first video stream by default).
+
+    Cheap, so it skips the queue.
+    """
+    select = ["-select_streams", streams] if streams else []
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe", "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        *select,
+        path,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise FFmpegError(process.returncode, stderr.decode(errors="replace"))
+    return json.loads(stdout)
+
+
+# shared by every cog, so the limit is global
+executor = MediaExecutor(media_config.get("max_jobs") or max(1, (os.cpu_count() or 2) // 2))
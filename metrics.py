@@ -0,0 +1,247 @@
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+
+class JobMetrics:
+    """Encode stats per transform: running totals plus the last `history` jobs.
+
+    Shows which transforms eat the most capacity (CPU seconds per job, speed vs realtime).
+    """
+
+    def __init__(self, history: int = 100):
+        self.recent = defaultdict(lambda: deque(maxlen=history))
+        self.totals = defaultdict(lambda: {
+            "jobs": 0,
+            "failed": 0,
+            "input_seconds": 0.0,
+            "wall_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "output_bytes": 0
+        })
+
+    def record(self, transform: str, *, ok: bool, input_duration: float, wall: float, cpu: float, output_bytes: int, wait: float):
+        job = {
+            "ok": ok,
+            "input_duration": input_duration,
+            "wall": wall,
+            "cpu": cpu,
+            "speed": input_duration / wall if wall > 0 else 0.0,
+            "output_bytes": output_bytes,
+            "wait": wait
+        }
+        self.recent[transform].append(job)
+
+        totals = self.totals[transform]
+        totals["jobs"] += 1
+        if not ok:
+            totals["failed"] += 1
+        totals["input_seconds"] += input_duration
+        totals["wall_seconds"] += wall
+        totals["cpu_seconds"] += cpu
+        totals["output_bytes"] += output_bytes
+
+    def summary(self) -> dict:
+        result = {}
+        for transform, totals in self.totals.items():
+            jobs = totals["jobs"] or 1
+            result[transform] = {
+                **totals,
+                "avg_cpu_seconds": totals["cpu_seconds"] / jobs,
+                "avg_speed": totals["input_seconds"] / totals["wall_seconds"] if totals["wall_seconds"] else 0.0
+            }
+        return result
+
+
+class Timings:
+    """Named measurements (seconds, token counts, ...), keeping a count and sum plus the last `history` values."""
+
+    def __init__(self, history: int = 200):
+        self.recent = defaultdict(lambda: deque(maxlen=history))
+        self.counts = defaultdict(int)
+        self.sums = defaultdict(float)
+
+    def record(self, name: str, value: float):
+        self.recent[name].append(value)
+        self.counts[name] += 1
+        self.sums[name] += value
+
+    def summary(self) -> dict:
+        result = {}
+        for name, values in self.recent.items():
+            ordered = sorted(values)
+            result[name] = {
+                "count": self.counts[name],
+                "avg": self.sums[name] / self.counts[name],
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "last": values[-1]
+            }
+        return result
+
+
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class CommandMetrics:
+    """Per app command: invocations, errors, how many are running, and a histogram of how long they take.
+
+    Durations run from when the command tree receives the interaction to when the callback
+    returns, which for deferred commands is the wait from the "thinking..." state to the answer.
+    """
+
+    def __init__(self, buckets: tuple = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.started = {}  # interaction id -> (command name, monotonic start)
+        self.counts = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.in_flight = defaultdict(int)
+        self.histograms = defaultdict(lambda: [0] * (len(buckets) + 1))  # per bucket, the last one is +Inf
+        self.sums = defaultdict(float)
+
+    def start(self, interaction_id: int, name: str):
+        self.started[interaction_id] = (name, time.monotonic())
+        self.in_flight[name] += 1
+
+    def finish(self, interaction_id: int, ok: bool):
+        started = self.started.pop(interaction_id, None)
+        if not started:
+            return
+        name, start = started
+        duration = time.monotonic() - start
+        self.in_flight[name] -= 1
+        self.counts[name] += 1
+        if not ok:
+            self.errors[name] += 1
+        self.sums[name] += duration
+        bucket = next((i for i, bound in enumerate(self.buckets) if duration <= bound), len(self.buckets))
+        self.histograms[name][bucket] += 1
+
+    def quantile(self, name: str, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, the largest bound for the +Inf bucket."""
+        histogram = self.histograms[name]
+        target = q * sum(histogram)
+        seen = 0
+        for bound, count in zip(self.buckets + (self.buckets[-1],), histogram):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def summary(self) -> dict:
+        return {
+            name: {
+                "count": count,
+                "errors": self.errors[name],
+                "in_flight": self.in_flight[name],
+                "avg": self.sums[name] / count,
+                "p50": self.quantile(name, 0.5),
+                "p95": self.quantile(name, 0.95)
+            }
+            for name, count in self.counts.items()
+        }
+
+
+jobs = JobMetrics()
+llm = Timings()
+commands = CommandMetrics()
+sources = {}  # name -> callable returning a stats dict, read whenever metrics are exported
+
+
+def register(name: str, stats):
+    """Export `stats()`, e.g. a pool's or cache's stats method, as gauges named after `name`."""
+    sources[name] = stats
+
+
+def unregister(*names: str):
+    for name in names:
+        sources.pop(name, None)
+
+
+def collect() -> dict:
+    result = {}
+    for name, stats in list(sources.items()):
+        try:
+            result[name] = stats()
+        except Exception as e:
+            print(f"[ERROR] Failed to read {name} stats: {e}")
+    return result
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+def _number(value) -> str:
+    return str(int(value)) if isinstance(value, (bool, int)) else repr(float(value))
+
+
+def _gauges(prefix: str, stats: dict, **labels) -> list[str]:
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            # nested stats, e.g. per backend, become a label
+            lines.extend(_gauges(prefix, value, **labels, key=key))
+        elif isinstance(value, (bool, int, float)):
+            lines.append(f"{prefix}_{key}{_labels(**labels)} {_number(value)}")
+    return lines
+
+
+def render() -> str:
+    """Everything above in the Prometheus text exposition format."""
+    lines = []
+
+    def family(name: str, kind: str, help: str):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    family("katya_command_total", "counter", "App command invocations that finished.")
+    lines.extend(f"katya_command_total{_labels(command=name)} {count}" for name, count in commands.counts.items())
+    family("katya_command_errors_total", "counter", "App command invocations that raised.")
+    lines.extend(f"katya_command_errors_total{_labels(command=name)} {commands.errors[name]}" for name in commands.counts)
+    family("katya_command_in_flight", "gauge", "App commands running right now.")
+    lines.extend(f"katya_command_in_flight{_labels(command=name)} {count}" for name, count in commands.in_flight.items())
+    family("katya_command_duration_seconds", "histogram", "Time from receiving an app command to its callback returning.")
+    for name, histogram in commands.histograms.items():
+        total = 0
+        for bound, count in zip(commands.buckets + ("+Inf",), histogram):
+            total += count
+            lines.append(f"katya_command_duration_seconds_bucket{_labels(command=name, le=bound)} {total}")
+        lines.append(f"katya_command_duration_seconds_sum{_labels(command=name)} {_number(commands.sums[name])}")
+        lines.append(f"katya_command_duration_seconds_count{_labels(command=name)} {total}")
+
+    media = defaultdict(list)
+    for transform, totals in jobs.totals.items():
+        for key, value in totals.items():
+            media[key].append(f"katya_media_{key}_total{_labels(transform=transform)} {_number(value)}")
+    for key, samples in media.items():
+        family(f"katya_media_{key}_total", "counter", f"Media job totals per transform: {key.replace('_', ' ')}.")
+        lines.extend(samples)
+
+    for name, summary in llm.summary().items():
+        family(f"katya_llm_{name}", "summary", f"LLM {name.replace('_', ' ')}, quantiles over recent requests.")
+        lines.append(f"katya_llm_{name}{_labels(quantile=0.5)} {_number(summary['p50'])}")
+        lines.append(f"katya_llm_{name}{_labels(quantile=0.95)} {_number(summary['p95'])}")
+        lines.append(f"katya_llm_{name}_sum {_number(llm.sums[name])}")
+        lines.append(f"katya_llm_{name}_count {summary['count']}")
+
+    for name, stats in collect().items():
+        lines.extend(_gauges(f"katya_{name}", stats))
+    return "\n".join(lines) + "\n"
+
+
+async def serve(host: str, port: int) -> web.AppRunner:
+    """Serve render() at http://host:port/metrics until the returned runner is cleaned up."""
+    async def handle(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8", headers={"Cache-Control": "no-store"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
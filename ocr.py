@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import hashlib
+import io
+from collections import OrderedDict
+
+from PIL import Image, ImageChops
+
+from workers import WorkerPool
+
+HASH_SIZE = 16  # 16x16 difference hash, 256 bits
+MAX_DISTANCE = 24  # hash bits that may differ for an image to be a candidate match
+MAX_PIXEL_DIFF = 64  # brightest pixel difference between two encodings of the same picture, at full size
+MAX_CANDIDATES = 4  # close hashes checked pixel by pixel per lookup
+
+
+class Fingerprint:
+    """A decoded image, reduced to what's needed to recognise re-encoded copies of it.
+
+    Copies only count when they have the same dimensions. Resizing blurs small text until a
+    one-letter edit is indistinguishable from resampling noise, so resized reposts go through
+    OCR again. Decoding is slow, create these in a thread.
+    """
+
+    def __init__(self, data: bytes):
+        img = Image.open(io.BytesIO(data))
+        self.table = None  # luma quantization table, if the image is a jpeg
+        if img.format == "JPEG" and img.quantization:
+            self.table = list(img.quantization[0])
+            # let libjpeg hand over just the luma plane
+            img.draft("L", img.size)
+        self.gray = img.convert("L")
+        self.size = self.gray.size
+
+        small = self.gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX).tobytes()
+        value = 0
+        for row in range(HASH_SIZE):
+            for col in range(HASH_SIZE):
+                i = row * (HASH_SIZE + 1) + col
+                value = (value << 1) | (small[i] > small[i + 1])
+        self.phash = value
+
+        # kept losslessly, a lossy copy would hide exactly the details that tell images apart
+        buffer = io.BytesIO()
+        self.gray.save(buffer, "PNG", compress_level=1)
+        self.detail = buffer.getvalue()
+
+    def matches(self, detail: bytes, table: list[int] | None) -> bool:
+        """Whether the picture stored as `detail` is this one, both as they'd look after the same jpeg compression.
+
+        A recompressed copy differs from its original by JPEG noise that can be as strong as a
+        changed letter. Putting the less compressed side through the other's quantization
+        table reproduces that noise, so only real changes are left to compare.
+        """
+        mine = self.gray
+        other = Image.open(io.BytesIO(detail))
+        if coarser(table, self.table):
+            mine = recompress(mine, table)
+        elif coarser(self.table, table):
+            other = recompress(other, self.table)
+        return ImageChops.difference(mine, other).getextrema()[1] <= MAX_PIXEL_DIFF
+
+
+def coarser(table: list[int] | None, other: list[int] | None) -> bool:
+    return table is not None and (other is None or sum(table) > sum(other))
+
+
+def recompress(gray: Image.Image, table: list[int]) -> Image.Image:
+    buffer = io.BytesIO()
+    gray.save(buffer, "JPEG", qtables=[table])
+    return Image.open(buffer).convert("L")
+
+
+class OCRCache:
+    """OCR results by exact content hash, falling back to re-encoded copies, bounded by `max_items` and `max_bytes`.
+
+    Recompressed reposts of the same screenshot miss the exact hash but match their original
+    once compared pixel by pixel. Each entry keeps a losslessly compressed grayscale copy of
+    its image for that, usually 30-300KB.
+    """
+
+    def __init__(self, max_items: int, max_bytes: int):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()  # sha256 -> (hash, dimensions, grayscale png, quantization table, text)
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "perceptual_hits": self.perceptual_hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.size
+        }
+
+    def get_exact(self, digest: str) -> str | None:
+        entry = self.entries.get(digest)
+        if entry:
+            self.entries.move_to_end(digest)
+            self.hits += 1
+            return entry[4]
+        return None
+
+    def candidates(self, fingerprint: Fingerprint) -> list[tuple]:
+        """Entries that may be copies of `fingerprint`: same dimensions and a close hash, most recent first."""
+        found = []
+        for digest, entry in reversed(self.entries.items()):
+            if entry[1] == fingerprint.size and (entry[0] ^ fingerprint.phash).bit_count() <= MAX_DISTANCE:
+                found.append((digest, *entry))
+                if len(found) == MAX_CANDIDATES:
+                    break
+        return found
+
+    def found(self, digest: str | None):
+        """Count the outcome of a candidates() lookup, `digest` being the entry that matched, if any."""
+        if digest is None:
+            self.misses += 1
+            return
+        self.perceptual_hits += 1
+        if digest in self.entries:
+            self.entries.move_to_end(digest)
+
+    def put(self, digest: str, fingerprint: Fingerprint, text: str):
+        if digest in self.entries:
+            self.size -= len(self.entries.pop(digest)[2])
+        self.entries[digest] = (fingerprint.phash, fingerprint.size, fingerprint.detail, fingerprint.table, text)
+        self.size += len(fingerprint.detail)
+        while self.entries and (len(self.entries) > self.max_items or self.size > self.max_bytes):
+            self.size -= len(self.entries.popitem(last=False)[1][2])
+
+
+class OCR:
+    """Text recognition off the event loop, in a pool of `ocr_worker` processes, with a result cache."""
+
+    def __init__(self, pool: WorkerPool, cache_size: int, cache_bytes: int):
+        self.pool = pool
+        self.cache = OCRCache(cache_size, cache_bytes)
+
+    async def read(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        text = self.cache.get_exact(digest)
+        if text is not None:
+            return text
+
+        fingerprint = await asyncio.to_thread(Fingerprint, data)
+        candidates = self.cache.candidates(fingerprint)
+        match = None
+        if candidates:
+            match = await asyncio.to_thread(
+                lambda: next((c for c in candidates if fingerprint.matches(c[3], c[4])), None)
+            )
+        self.cache.found(match[0] if match else None)
+        if match:
+            # remember this exact copy too, so the next repost is a cheap exact hit
+            self.cache.put(digest, fingerprint, match[5])
+            return match[5]
+
+        result = await self.pool.run({"image": base64.b64encode(data).decode()})
+        self.cache.put(digest, fingerprint, result["text"])
+        return result["text"]
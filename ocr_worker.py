@@ -0,0 +1,71 @@
+# Long-lived OCR worker, started by a workers.WorkerPool as `python -m ocr_worker`.
+# Takes {"image": base64} jobs and answers {"text"}. With tesserocr installed the tesseract
+# engine stays loaded between jobs; without it every job forks tesseract through pytesseract.
+import base64
+import io
+
+from PIL import Image, ImageOps
+
+from workers import serve
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+    import pytesseract
+
+MAX_PIXELS = 8_000_000  # bigger images are downscaled before anything else happens
+TARGET_DPI = 300
+ASSUMED_DPI = 96  # screenshots rarely carry a dpi, and are made for ~96dpi screens
+MAX_UPSCALE = 2.0
+
+api = None
+
+
+def preprocess(data: bytes) -> Image.Image:
+    """Grayscale and rescale towards TARGET_DPI, capped at MAX_PIXELS."""
+    img = Image.open(io.BytesIO(data))
+    dpi = img.info.get("dpi", (ASSUMED_DPI,))[0] or ASSUMED_DPI
+
+    pixels = img.width * img.height
+    if pixels > MAX_PIXELS:
+        # jpegs can decode straight at a fraction of their size, far cheaper than a full decode
+        factor = (MAX_PIXELS / pixels) ** 0.5
+        img.draft("RGB", (int(img.width * factor), int(img.height * factor)))
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        # transparent backgrounds would turn black and hide dark text
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, "white")
+        img = Image.alpha_composite(background, img)
+    img = img.convert("L")
+
+    scale = min(MAX_UPSCALE, TARGET_DPI / dpi)
+    scale = min(scale, (MAX_PIXELS / (img.width * img.height)) ** 0.5)
+    if abs(scale - 1) > 0.05:
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+    return img
+
+
+def recognize(img: Image.Image) -> str:
+    if tesserocr:
+        api.SetImage(img)
+        api.SetSourceResolution(TARGET_DPI)
+        return api.GetUTF8Text()
+    return pytesseract.image_to_string(img, config=f"--dpi {TARGET_DPI}")
+
+
+def handle(job: dict) -> dict:
+    return {"text": recognize(preprocess(base64.b64decode(job["image"])))}
+
+
+def main():
+    global api
+    if tesserocr:
+        api = tesserocr.PyTessBaseAPI()
+    serve(handle)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import openai
+
+
+class BackendError(Exception):
+    pass
+
+
+class Backend:
+    """One OpenAI-compatible server, and how it has been doing lately."""
+
+    def __init__(self, name: str, client, model: str, weight: float = 1):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.weight = max(weight, 0.01)
+        self.outstanding = 0  # requests in flight, streams count until they're closed
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0  # in a row, reset by any success
+        self.ejected_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def stats(self) -> dict:
+        return {
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "healthy": self.available(time.monotonic())
+        }
+
+
+class LLMRouter:
+    """Spreads chat completions over several backends by least outstanding requests, per unit of weight.
+
+    A backend that fails `max_failures` requests in a row, or a health probe, is ejected for
+    `eject_seconds` and then tried again; a passing probe brings it back early. A request that
+    can't connect, times out or gets a 5xx or 429 before any output moves on to the next backend,
+    so queued /ask questions keep going while one server restarts.
+    """
+
+    def __init__(self, backends: list[Backend], max_failures: int = 3, eject_seconds: float = 60, probe_timeout: float = 5):
+        self.backends = backends
+        self.max_failures = max(1, max_failures)
+        self.eject_seconds = eject_seconds
+        self.probe_timeout = probe_timeout
+
+    def stats(self) -> dict:
+        return {backend.name: backend.stats() for backend in self.backends}
+
+    def pick(self, exclude=()) -> Backend:
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            raise BackendError("No backend could answer, try again in a bit.")
+        now = time.monotonic()
+        healthy = [backend for backend in candidates if backend.available(now)]
+        if not healthy:
+            # everything left is ejected, the one due back soonest is better than nothing
+            return min(candidates, key=lambda backend: backend.ejected_until)
+        return min(healthy, key=lambda backend: ((backend.outstanding + 1) / backend.weight, backend.requests / backend.weight))
+
+    @staticmethod
+    def retryable(error: Exception) -> bool:
+        """Whether another backend might do better, rather than the request itself being at fault."""
+        if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and (error.status_code >= 500 or error.status_code == 429)
+
+    def _succeeded(self, backend: Backend):
+        backend.failures = 0
+        backend.ejected_until = 0.0
+
+    def _failed(self, backend: Backend, error: Exception):
+        backend.errors += 1
+        backend.failures += 1
+        if backend.failures >= self.max_failures and backend.available(time.monotonic()):
+            self._eject(backend, error)
+
+    def _eject(self, backend: Backend, error: Exception):
+        backend.ejected_until = time.monotonic() + self.eject_seconds
+        print(f"[ERROR] LLM backend {backend.name} ejected for {self.eject_seconds:g}s: {error}")
+
+    async def complete(self, **kwargs):
+        """A non-streamed chat completion from the first backend that manages one."""
+        tried = []
+        while True:
+            backend = self.pick(tried)
+            tried.append(backend)
+            backend.outstanding += 1
+            backend.requests += 1
+            try:
+                response = await backend.client.chat.completions.create(model=backend.model, **kwargs)
+            except Exception as e:
+                if not self.retryable(e):
+                    raise
+                self._failed(backend, e)
+                if len(tried) == len(self.backends):
+                    raise
+                continue
+            finally:
+                backend.outstanding -= 1
+            self._succeeded(backend)
+            return response
+
+    @asynccontextmanager
+    async def stream(self, **kwargs):
+        """A streamed chat completion, yielding an async iterator of its chunks.
+
+        Backends are only switched until the first chunk arrives, after that an error is
+        raised to the caller as the answer has already started showing.
+        """
+        tried = []
+        while True:
+            backend = self.pick(tried)
+            tried.append(backend)
+            backend.outstanding += 1
+            backend.requests += 1
+            stream = None
+            try:
+                stream = await backend.client.chat.completions.create(model=backend.model, stream=True, **kwargs)
+                chunks = stream.__aiter__()
+                try:
+                    first = [await chunks.__anext__()]
+                except StopAsyncIteration:
+                    first = []
+                break
+            except BaseException as e:
+                backend.outstanding -= 1
+                if stream is not None:
+                    await stream.close()
+                if not isinstance(e, Exception) or not self.retryable(e):
+                    raise
+                self._failed(backend, e)
+                if len(tried) == len(self.backends):
+                    raise
+
+        async def rest():
+            for chunk in first:
+                yield chunk
+            async for chunk in chunks:
+                yield chunk
+
+        try:
+            yield rest()
+        except Exception as e:
+            if self.retryable(e):
+                self._failed(backend, e)
+            raise
+        else:
+            self._succeeded(backend)
+        finally:
+            backend.outstanding -= 1
+            await stream.close()
+
+    async def probe(self, backend: Backend):
+        try:
+            await asyncio.wait_for(backend.client.models.list(), self.probe_timeout)
+        except Exception as e:
+            if backend.available(time.monotonic()):
+                self._eject(backend, e)
+            else:
+                # still down, keep it out until the next probe
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+            return
+        if not backend.available(time.monotonic()):
+            print(f"[INFO] LLM backend {backend.name} is back")
+        self._succeeded(backend)
+
+    async def monitor(self, interval: float):
+        while True:
+            await asyncio.gather(*(self.probe(backend) for backend in self.backends))
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        await asyncio.gather(*(backend.client.close() for backend in self.backends), return_exceptions=True)
+
+
+def create_router(openai_config: dict) -> LLMRouter:
+    timeout = openai_config.get("timeout", 120)
+    entries = openai_config.get("backends") or [{"base_url": openai_config["base_url"]}]
+    # with somewhere else to go, failing over beats retrying the same server; alone, the
+    # client's own retries with backoff are all there is
+    retries = 0 if len(entries) > 1 else openai.DEFAULT_MAX_RETRIES
+    backends = []
+    for entry in entries:
+        client = openai.AsyncOpenAI(
+            api_key=entry.get("api_key", openai_config["api_key"]),
+            base_url=entry["base_url"],
+            timeout=entry.get("timeout", timeout),
+            max_retries=retries
+        )
+        backends.append(Backend(
+            entry.get("name", entry["base_url"]),
+            client,
+            entry.get("model", openai_config["model"]),
+            entry.get("weight", 1)
+        ))
+    return LLMRouter(
+        backends,
+        max_failures=openai_config.get("max_failures", 3),
+        eject_seconds=openai_config.get("eject_seconds", 60),
+        probe_timeout=openai_config.get("probe_timeout", 5)
+    )
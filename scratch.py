@@ -0,0 +1,92 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from helper import branding, generate_prefix
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def link_or_copy(source: str, target: str):
+    """Hardlink `source` to `target`, or copy it if they're on different filesystems.
+
+    Either way `target` stays readable after `source` is deleted.
+    """
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class Scratch:
+    """Temp space for media jobs, all under one root (e.g. a tmpfs mount).
+
+    Each job reserves the bytes it expects to need before it starts, against a per-job
+    and a global quota and the free space on the disk, so running low shows up as a
+    refused job instead of ENOSPC halfway through an encode. Job directories are always
+    removed afterwards, and a janitor clears `branding_*` leftovers from crashes.
+    """
+
+    def __init__(self, root: str | None, max_bytes: int, job_bytes: int):
+        self.root = root or tempfile.gettempdir()
+        self.max_bytes = max_bytes
+        self.job_bytes = job_bytes
+        self.reserved = 0
+        self.active = set()
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextmanager
+    def job(self, expected_bytes: int):
+        """Reserve `expected_bytes` and yield a fresh directory, removed on exit."""
+        expected_bytes = max(0, int(expected_bytes))
+        if expected_bytes > self.job_bytes:
+            raise QuotaExceeded(f"This needs about {expected_bytes // 1024 // 1024}MB of scratch space, more than one job is allowed.")
+        if self.reserved + expected_bytes > self.max_bytes:
+            raise QuotaExceeded("Too many media jobs are running right now, try again in a bit.")
+        # running jobs may not have written what they reserved yet, count it as already used
+        if shutil.disk_usage(self.root).free - (self.reserved + expected_bytes) < 0:
+            raise QuotaExceeded("The bot is low on disk space right now, try again in a bit.")
+
+        path = tempfile.mkdtemp(prefix=generate_prefix(), dir=self.root)
+        self.reserved += expected_bytes
+        self.active.add(path)
+        try:
+            yield path
+        finally:
+            self.active.discard(path)
+            shutil.rmtree(path, ignore_errors=True)
+            self.reserved -= expected_bytes
+
+    def sweep(self, max_age: float = 0) -> int:
+        """Remove `branding_*` files and directories older than `max_age` that no job owns."""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not name.startswith(f"{branding}_") or path in self.active:
+                continue
+            try:
+                if now - os.path.getmtime(path) < max_age:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    async def janitor(self, interval: float, max_age: float):
+        # anything left at startup is from a crash, after that only clear what's clearly stale
+        removed = await asyncio.to_thread(self.sweep)
+        if removed:
+            print(f"[INFO] Removed {removed} leftover scratch files")
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.sweep, max_age)
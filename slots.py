@@ -0,0 +1,106 @@
+import asyncio
+
+
+class Waiter:
+    """One caller waiting for a slot."""
+
+    __slots__ = ("future", "on_queued", "position", "key")
+
+    def __init__(self, on_queued=None, key=None):
+        self.future = asyncio.get_running_loop().create_future()
+        self.on_queued = on_queued
+        self.position = None  # last position on_queued was told
+        self.key = key
+
+    @property
+    def handed_over(self) -> bool:
+        return self.future.done() and not self.future.cancelled() and self.future.exception() is None
+
+
+class SlotQueue:
+    """At most `max_running` holders at a time, everyone else waits for a slot to be handed over.
+
+    A freed slot goes straight to the next waiter instead of back to the pool, so nobody can
+    jump the queue between a release and the waiter waking up. Subclasses pick the serving
+    order by implementing _push, _pop, _discard and _order. `on_queued` callbacks are awaited
+    with a waiter's queue position whenever it changes.
+    """
+
+    def __init__(self, max_running: int):
+        self.max_running = max(1, max_running)
+        self.running = 0
+        self._tasks = set()
+
+    @property
+    def queued(self) -> int:
+        return len(self._order())
+
+    def _push(self, waiter: Waiter):
+        raise NotImplementedError
+
+    def _pop(self) -> Waiter | None:
+        """Take the next waiter to serve off the queue, None if it's empty."""
+        raise NotImplementedError
+
+    def _discard(self, waiter: Waiter) -> bool:
+        """Take `waiter` off the queue, False if it wasn't on it."""
+        raise NotImplementedError
+
+    def _order(self) -> list[Waiter]:
+        """Waiters in the order they'll be served."""
+        raise NotImplementedError
+
+    def _notify(self, callback, *args):
+        async def call():
+            try:
+                await callback(*args)
+            except Exception as e:
+                print(f"[ERROR] Callback failed: {e}")
+
+        task = asyncio.create_task(call())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _notify_positions(self):
+        for position, waiter in enumerate(self._order(), start=1):
+            if waiter.on_queued and waiter.position != position:
+                waiter.position = position
+                self._notify(waiter.on_queued, position)
+
+    def _try_acquire(self) -> bool:
+        """Take a free slot if there is one and nobody is waiting for it."""
+        if self.running < self.max_running and not self.queued:
+            self.running += 1
+            return True
+        return False
+
+    async def _wait(self, waiter: Waiter):
+        """Queue `waiter` and wait until a slot is handed to it."""
+        self._push(waiter)
+        self._notify_positions()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if self._discard(waiter):
+                self._notify_positions()
+            elif waiter.handed_over:
+                # the slot was handed to us right before we got cancelled
+                self._release()
+            raise
+
+    def _fail(self, waiter: Waiter, error: Exception):
+        """Take `waiter` off the queue and raise `error` in it, if it's still waiting."""
+        if self._discard(waiter):
+            if not waiter.future.done():  # cancelled, its task just hasn't run yet
+                waiter.future.set_exception(error)
+            self._notify_positions()
+
+    def _release(self):
+        while (waiter := self._pop()) is not None:
+            if not waiter.future.done():
+                # hand the slot straight over, `running` stays the same
+                waiter.future.set_result(None)
+                self._notify_positions()
+                return
+        self.running -= 1
@@ -0,0 +1,138 @@
+import asyncio
+import math
+import platform
+import time
+from collections import deque
+
+import cpuinfo
+import psutil
+
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: list[float], low: float | None = None, high: float | None = None) -> str:
+    """`values` as a row of block characters, scaled between `low` and `high` (their own range by default)."""
+    if not values:
+        return ""
+    low = min(values) if low is None else low
+    high = max(values) if high is None else high
+    span = high - low
+    if span <= 0:
+        return SPARKS[0] * len(values)
+    return "".join(SPARKS[min(len(SPARKS) - 1, max(0, int((value - low) / span * len(SPARKS))))] for value in values)
+
+
+def static_facts() -> dict:
+    """What doesn't change while the bot runs. Slow, py-cpuinfo spawns helpers to read the CPU model."""
+    return {
+        "os": f"{platform.system()} {platform.release()}\n{platform.version()}",
+        "python": platform.python_version(),
+        "cpu": cpuinfo.get_cpu_info().get("brand_raw") or platform.processor(),
+        "cores": psutil.cpu_count()
+    }
+
+
+async def query_gpus(timeout: float = 5) -> list[dict] | None:
+    """Name and memory of each NVIDIA GPU from nvidia-smi, or None without one."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "nvidia-smi", "--query-gpu=name,memory.used,memory.total", "--format=csv,noheader,nounits",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError:
+        return None
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return None
+    if process.returncode != 0:
+        return None
+
+    gpus = []
+    for line in output.decode("utf-8").strip().splitlines():
+        name, used, total = [part.strip() for part in line.split(",")]
+        gpus.append({"name": name, "memory_used": int(used), "memory_total": int(total)})
+    return gpus or None
+
+
+class SystemSampler:
+    """Samples system counters every `interval` seconds into a ring buffer of the last `history`.
+
+    Static facts are gathered once in the background at start, so readers never wait on
+    py-cpuinfo or nvidia-smi. CPU % is measured over each interval rather than in one instant,
+    and event loop lag is how late the sampler wakes up. `latency` returns the gateway latency
+    in seconds.
+    """
+
+    def __init__(self, interval: float = 10, history: int = 60, latency=None):
+        self.interval = interval
+        self.latency = latency
+        self.samples = deque(maxlen=history)
+        self.facts = {
+            "os": f"{platform.system()} {platform.release()}",
+            "python": platform.python_version(),
+            "cpu": platform.processor() or "Unknown",
+            "cores": psutil.cpu_count()
+        }
+        self.gpus = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+
+    @property
+    def latest(self) -> dict | None:
+        return self.samples[-1] if self.samples else None
+
+    def series(self, name: str) -> list[float]:
+        return [sample[name] for sample in self.samples if sample.get(name) is not None]
+
+    def _sample_system(self) -> dict:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage("/")
+        frequency = psutil.cpu_freq()
+        return {
+            "cpu": psutil.cpu_percent(),  # since the previous call, i.e. over the last interval
+            "ram_used": memory.used,
+            "ram_total": memory.total,
+            "ram_percent": memory.percent,
+            "disk_used": disk.used,
+            "disk_total": disk.total,
+            "cpu_freq": frequency.current if frequency else None
+        }
+
+    async def sample(self, loop_lag: float = 0.0):
+        sample = {"time": time.time(), "loop_lag": loop_lag, **await asyncio.to_thread(self._sample_system)}
+        latency = self.latency() if self.latency else None
+        sample["latency"] = latency if latency is not None and math.isfinite(latency) else None
+        if self.gpus:
+            gpus = await query_gpus()
+            if gpus:
+                self.gpus = gpus
+            sample["gpu_used"] = sum(gpu["memory_used"] for gpu in self.gpus)
+        self.samples.append(sample)
+
+    async def run(self):
+        psutil.cpu_percent()  # start the first measurement interval, it runs while the facts are read
+        try:
+            self.facts = await asyncio.to_thread(static_facts)
+        except Exception as e:
+            print(f"[ERROR] Failed to read system info: {e}")
+        self.gpus = await query_gpus()
+
+        lag = 0.0
+        while True:
+            try:
+                await self.sample(lag)
+            except Exception as e:
+                print(f"[ERROR] Failed to sample system metrics: {e}")
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - start - self.interval)
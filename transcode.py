@@ -0,0 +1,98 @@
+import os
+
+from mediajobs import executor, probe
+
+AUDIO_BITRATE = 96_000
+LOW_AUDIO_BITRATE = 48_000
+MIN_VIDEO_BITRATE = 100_000
+HEADROOM = 0.95  # container overhead and rate control wobble
+# (minimum video bitrate, max height): lower bitrates look better at lower resolutions
+HEIGHTS = ((1_500_000, 1080), (800_000, 720), (400_000, 480), (0, 360))
+
+
+class CannotFit(Exception):
+    pass
+
+
+async def remux(input_path: str, output_path: str, on_queued=None, on_progress=None):
+    # first video and audio stream only, no re-encode
+    await executor.run([
+        "ffmpeg", "-y",
+        "-i", input_path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path
+    ], name="remux", on_queued=on_queued, on_progress=on_progress)
+
+
+async def fit_to_size(input_path: str, workdir: str, limit: int, on_queued=None, on_progress=None) -> str:
+    """Make `input_path` fit under `limit` bytes and return the new file, written in `workdir`.
+
+    If the audio and video streams alone already fit, they're remuxed without re-encoding
+    and the expensive path is skipped. Otherwise it's a two-pass x264 encode at the bitrate
+    that fills the limit over the clip's duration.
+    """
+    data = await probe(input_path, streams=None)
+    streams = data.get("streams") or []
+    duration = float((data.get("format") or {}).get("duration") or 0)
+    if duration <= 0:
+        raise CannotFit("Couldn't read the video's duration.")
+
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if not video:
+        raise CannotFit("The download has no video stream.")
+
+    output_path = os.path.join(workdir, "fit.mp4")
+
+    video_rate = int(video.get("bit_rate") or 0)
+    audio_rate = int(audio.get("bit_rate") or 0) if audio else 0
+    if video_rate and (video_rate + audio_rate) * duration / 8 <= limit * HEADROOM:
+        await remux(input_path, output_path, on_queued, on_progress)
+        if os.path.getsize(output_path) <= limit:
+            return output_path
+
+    budget = limit * 8 * HEADROOM / duration
+    audio_bitrate = 0
+    if audio:
+        audio_bitrate = AUDIO_BITRATE if budget > 4 * AUDIO_BITRATE else LOW_AUDIO_BITRATE
+    video_bitrate = int(budget - audio_bitrate)
+    if video_bitrate < MIN_VIDEO_BITRATE:
+        raise CannotFit(f"The video is too long to fit in {limit // 1024 // 1024}MB at a watchable quality.")
+
+    height = next(h for rate, h in HEIGHTS if video_bitrate >= rate)
+    passlog = os.path.join(workdir, "passlog")
+    encode = [
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-b:v", str(video_bitrate),
+        "-maxrate", str(int(video_bitrate * 1.5)),
+        "-bufsize", str(video_bitrate * 2),
+        "-vf", f"scale=-2:'min({height},ih)'",
+        "-passlogfile", passlog
+    ]
+
+    await executor.run([
+        "ffmpeg", "-y",
+        "-i", input_path,
+        *encode,
+        "-pass", "1",
+        "-an",
+        "-f", "null", os.devnull
+    ], name="fit-pass1", on_queued=on_queued, on_progress=on_progress)
+
+    audio_args = ["-c:a", "aac", "-b:a", str(audio_bitrate)] if audio else ["-an"]
+    await executor.run([
+        "ffmpeg", "-y",
+        "-i", input_path,
+        *encode,
+        "-pass", "2",
+        *audio_args,
+        "-movflags", "+faststart",
+        output_path
+    ], name="fit-pass2", on_queued=on_queued, on_progress=on_progress)
+
+    if os.path.getsize(output_path) > limit:
+        raise CannotFit(f"The re-encoded video still came out over {limit // 1024 // 1024}MB.")
+    return output_path
@@ -0,0 +1,151 @@
+import asyncio
+
+from googletrans import Translator
+
+import language
+from cache import MemoryCache
+
+
+class TranslationError(Exception):
+    pass
+
+
+class TranslationBackend:
+    """Somewhere to send translations, a whole batch at a time."""
+
+    async def translate(self, texts: list[str], src: str, dest: str) -> list[tuple[str, str]]:
+        """Translate `texts` and return (translated text, source language) for each, in order."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class GoogleBackend(TranslationBackend):
+    """Google Translate through googletrans, on one long-lived HTTP/2 client.
+
+    The web API has no batch endpoint, so a batch goes out as up to `concurrency`
+    requests at a time over that one connection.
+    """
+
+    def __init__(self, timeout: float = 10, concurrency: int = 4):
+        self.concurrency = concurrency
+        self.translator = Translator(timeout=timeout, list_operation_max_concurrency=concurrency)
+
+    async def translate(self, texts: list[str], src: str, dest: str) -> list[tuple[str, str]]:
+        results = await self.translator.translate(texts, src=src, dest=dest, list_operation_max_concurrency=self.concurrency)
+        return [(result.text, result.src) for result in results]
+
+    async def close(self):
+        await self.translator.client.aclose()
+
+
+BACKENDS = {
+    "google": GoogleBackend
+}
+
+
+class TranslationService:
+    """Translations through one backend, with an LRU cache, request batching and timeouts.
+
+    Requests for the same languages arriving within `window` seconds of each other go
+    upstream as one batch of up to `max_batch` texts, and identical texts share a result.
+    With a `detector`, text already in the target language never goes upstream at all,
+    and a language written in a script of its own is sent along instead of "auto".
+    """
+
+    def __init__(self, backend: TranslationBackend, cache_size: int = 2000, window: float = 0.05, max_batch: int = 16, timeout: float = 10, detector=None):
+        self.backend = backend
+        self.detector = detector
+        self.skipped = 0
+        self.cache = MemoryCache(cache_size)
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.pending = {}  # (src, dest) -> {text: future}
+        self.timers = {}  # (src, dest) -> timer that flushes the batch
+        self._tasks = set()
+
+    async def translate(self, text: str, dest: str = "en", src: str = "auto") -> tuple[str, str]:
+        """Translate `text` into `dest`, returning (translated text, source language)."""
+        if self.detector and src == "auto":
+            detected = self.detector(text)
+            if detected == dest:
+                self.skipped += 1
+                return text, dest
+            if detected in language.OWN_SCRIPT:
+                # anything else is a guess that may be a language without a model, Google knows more
+                src = detected
+
+        cached = self.cache.get((text, src, dest))
+        if cached:
+            return cached
+
+        languages = (src, dest)
+        batch = self.pending.setdefault(languages, {})
+        future = batch.get(text)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            batch[text] = future
+            if len(batch) >= self.max_batch:
+                self._flush(languages)
+            elif languages not in self.timers:
+                self.timers[languages] = asyncio.get_running_loop().call_later(self.window, self._flush, languages)
+
+        try:
+            # a caller timing out shouldn't fail the rest of its batch
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise TranslationError(f"Timed out after {self.timeout:.0f} seconds.")
+
+    def _flush(self, languages: tuple[str, str]):
+        timer = self.timers.pop(languages, None)
+        if timer:
+            timer.cancel()
+        batch = self.pending.pop(languages, None)
+        if batch:
+            task = asyncio.create_task(self._send(languages, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, languages: tuple[str, str], batch: dict):
+        src, dest = languages
+        texts = list(batch)
+        try:
+            results = await asyncio.wait_for(self.backend.translate(texts, src, dest), self.timeout)
+        except Exception as e:
+            error = e if isinstance(e, TranslationError) else TranslationError(str(e) or type(e).__name__)
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error)
+                    # every caller may have timed out already, don't log it as unretrieved
+                    future.exception()
+            return
+
+        for text, result in zip(texts, results):
+            self.cache.put((text, src, dest), result)
+            if not batch[text].done():
+                batch[text].set_result(result)
+
+    async def close(self):
+        for timer in self.timers.values():
+            timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await self.backend.close()
+
+
+def create_translation_service(translate_config: dict) -> TranslationService:
+    timeout = translate_config.get("timeout", 10)
+    backend = BACKENDS[translate_config.get("backend", "google")](
+        timeout=timeout,
+        concurrency=translate_config.get("concurrency", 4)
+    )
+    return TranslationService(
+        backend,
+        cache_size=translate_config.get("cache_size", 2000),
+        window=translate_config.get("batch_window", 0.05),
+        max_batch=translate_config.get("max_batch", 16),
+        timeout=timeout,
+        detector=language.detect if translate_config.get("local_detect", True) else None
+    )
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import timedelta
+
+import aiohttp
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadHost:
+    """Somewhere to put files too big to send on Discord."""
+
+    expires: timedelta | None = None
+
+    async def upload(self, session: aiohttp.ClientSession, path: str, filename: str) -> str:
+        """Upload the file at `path` and return its public URL."""
+        raise NotImplementedError
+
+
+class FormUploadHost(UploadHost):
+    """Pomf-style hosts like uguu.se: a multipart POST answered with {"success", "files": [{"url"}]}.
+
+    The file object is handed to aiohttp, which streams it from disk in chunks
+    instead of holding the whole file in memory.
+    """
+
+    def __init__(self, url: str, field: str = "files[]", expires_hours: float | None = None):
+        self.url = url
+        self.field = field
+        self.expires = timedelta(hours=expires_hours) if expires_hours else None
+
+    async def upload(self, session: aiohttp.ClientSession, path: str, filename: str) -> str:
+        try:
+            with open(path, "rb") as f:
+                form = aiohttp.FormData()
+                form.add_field(self.field, f, filename=filename)
+                async with session.post(self.url, data=form) as resp:
+                    if resp.status != 200:
+                        raise UploadError(f"Upload host returned status {resp.status}.")
+                    result = await resp.json(content_type=None)
+        except asyncio.TimeoutError:
+            raise UploadError("Upload host took too long to answer.")
+        except aiohttp.ClientError as e:
+            raise UploadError(f"Couldn't reach the upload host: {e}")
+        except ValueError:
+            # a 200 with an HTML error page instead of JSON
+            raise UploadError("Upload host returned an invalid response.")
+
+        files = result.get("files") if isinstance(result, dict) else None
+        if not (files and result.get("success") and "url" in files[0]):
+            raise UploadError("Upload host returned an invalid response.")
+        return files[0]["url"]
+
+
+HOSTS = {
+    "form": FormUploadHost
+}
+
+
+def create_upload_host(upload_config: dict) -> UploadHost:
+    options = dict(upload_config)
+    host = options.pop("host", "form")
+    options.setdefault("url", "https://uguu.se/upload")
+    if host == "form":
+        options.setdefault("expires_hours", 3)
+    return HOSTS[host](**options)
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import sys
+
+
+class WorkerError(Exception):
+    pass
+
+
+class Worker:
+    """One long-lived `python -m <module>` subprocess, talking JSON lines over its stdin/stdout."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+
+    @classmethod
+    async def start(cls, module: str) -> "Worker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", module,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            limit=16 * 1024 * 1024
+        )
+        return cls(process)
+
+    async def run(self, job: dict) -> dict:
+        self.process.stdin.write((json.dumps(job) + "\n").encode())
+        await self.process.stdin.drain()
+        line = await self.process.stdout.readline()
+        if not line:
+            raise WorkerError("Worker exited unexpectedly.")
+        return json.loads(line)
+
+    async def kill(self):
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+
+
+class WorkerPool:
+    """Pre-warmed worker processes, so heavy work never runs in the bot process.
+
+    At most `max_queue` jobs wait for a free worker; past that, requests fail fast.
+    A job that times out or is cancelled kills its worker, which is replaced in the background.
+    Workers answer each job with a dict, or {"error": message} which is raised as WorkerError.
+    """
+
+    def __init__(self, module: str, size: int, max_queue: int, timeout: float):
+        self.module = module
+        self.size = max(1, size)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.idle = asyncio.Queue()
+        self.waiting = 0
+        self.busy = 0
+        self.workers = set()
+        self._tasks = set()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.workers),
+            "busy": self.busy,
+            "waiting": self.waiting
+        }
+
+    async def _spawn(self):
+        worker = await Worker.start(self.module)
+        self.workers.add(worker)
+        self.idle.put_nowait(worker)
+
+    async def start(self):
+        await asyncio.gather(*(self._spawn() for _ in range(self.size)))
+
+    async def close(self):
+        for worker in list(self.workers):
+            await worker.kill()
+        self.workers.clear()
+
+    def _respawn(self):
+        async def respawn():
+            try:
+                await self._spawn()
+            except Exception as e:
+                print(f"[ERROR] Failed to restart {self.module} worker: {e}")
+
+        task = asyncio.create_task(respawn())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self, job: dict) -> dict:
+        if self.waiting >= self.max_queue:
+            raise WorkerError("Too many jobs are queued right now, try again in a bit.")
+
+        self.waiting += 1
+        try:
+            worker = await self.idle.get()
+        finally:
+            self.waiting -= 1
+
+        self.busy += 1
+        try:
+            result = await asyncio.wait_for(worker.run(job), self.timeout)
+        except BaseException as e:
+            # the worker may be mid-job, don't hand it to anyone else
+            self.workers.discard(worker)
+            await asyncio.shield(worker.kill())
+            self._respawn()
+            if isinstance(e, asyncio.TimeoutError):
+                raise WorkerError(f"Timed out after {self.timeout:.0f} seconds.")
+            raise
+        finally:
+            self.busy -= 1
+
+        self.idle.put_nowait(worker)
+        if "error" in result:
+            raise WorkerError(result["error"])
+        return result
+
+
+def serve(handle):
+    """Worker side: answer each JSON job from stdin with `handle(job)`, or {"error"} if it raises."""
+    out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    # anything the work itself prints goes to stderr, stdout is only for replies
+    os.dup2(2, 1)
+
+    for line in sys.stdin:
+        try:
+            reply = handle(json.loads(line))
+        except Exception as e:
+            reply = {"error": str(e)}
+        out.write(json.dumps(reply) + "\n")
+        out.flush()
@@ -0,0 +1,123 @@
+# Long-lived yt-dlp worker, started by a workers.WorkerPool as `python -m ytdl_worker`.
+# Reads one JSON job per line on stdin ({"url", "dir"}) and answers with one JSON line
+# on stdout ({"path"} or {"error"}). The YoutubeDL instance is built once and reused.
+import os
+
+import yt_dlp
+
+from helper import MAX_DISCORD_FILESIZE, generate_filename
+from workers import serve
+
+BASE_OPTS = {
+    "outtmpl": "video.%(ext)s",
+    "merge_output_format": "mp4",
+    "quiet": True,
+    "noplaylist": True,
+    "nocheckcertificate": True,
+    "ignoreerrors": False,
+    "logtostderr": False,
+    "no_warnings": True,
+    "source_address": "0.0.0.0"
+}
+
+MAX_DOWNLOAD_SIZE = 128 * 1024 * 1024  # anything over MAX_DISCORD_FILESIZE goes to the upload host
+# used when no format has a known or estimable size
+FALLBACK_FORMAT = "bestvideo+bestaudio/best"
+
+instance = None
+
+
+def get_ydl() -> yt_dlp.YoutubeDL:
+    global instance
+    if instance is None:
+        instance = yt_dlp.YoutubeDL(BASE_OPTS)
+    return instance
+
+
+def size_limit(url: str) -> int:
+    # tiktok links are always sent inline
+    return MAX_DISCORD_FILESIZE if "tiktok.com" in url.lower() else MAX_DOWNLOAD_SIZE
+
+
+def estimate_size(fmt: dict, duration: float | None) -> float | None:
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return size
+    # tbr is in kbit/s
+    if fmt.get("tbr") and duration:
+        return fmt["tbr"] * 1000 / 8 * duration
+    return None
+
+
+def plan_format(info: dict, limit: int) -> str | None:
+    """Pick the best format, or video+audio pair, whose known or estimated size fits under `limit`."""
+    duration = info.get("duration")
+    candidates = []  # (height, size, format spec)
+    videos, audios = [], []
+
+    for fmt in info.get("formats") or []:
+        size = estimate_size(fmt, duration)
+        if not size or size > limit:
+            continue
+        # yt-dlp leaves a codec out when it doesn't know it, only "none" means the stream isn't there
+        has_video = fmt.get("vcodec") != "none"
+        has_audio = fmt.get("acodec") != "none"
+        if has_video and has_audio:
+            candidates.append((fmt.get("height") or 0, size, fmt["format_id"]))
+        elif has_video:
+            videos.append((fmt, size))
+        elif has_audio:
+            audios.append((fmt, size))
+
+    # best sounding audio that still fits next to each video
+    audios.sort(key=lambda a: a[1], reverse=True)
+    for video, video_size in videos:
+        for audio, audio_size in audios:
+            if video_size + audio_size <= limit:
+                candidates.append((video.get("height") or 0, video_size + audio_size, f"{video['format_id']}+{audio['format_id']}"))
+                break
+
+    if not candidates:
+        return None
+    return max(candidates)[2]
+
+
+def download(url: str, tmpdir: str) -> str:
+    ydl = get_ydl()
+    ydl.params["paths"] = {"home": tmpdir}
+    limit = size_limit(url)
+
+    # look at the formats first so we only ever download once
+    info = ydl.extract_info(url, download=False)
+    spec = plan_format(info, limit)
+    if spec is None and limit == MAX_DISCORD_FILESIZE and info.get("formats"):
+        raise ValueError("Video larger than 10MB.")
+
+    ydl.format_selector = ydl.build_format_selector(spec or FALLBACK_FORMAT)
+    try:
+        info = ydl.process_ie_result(info, download=True)
+    finally:
+        ydl.format_selector = None
+
+    filepath = ydl.prepare_filename(info)
+    if not filepath.endswith(".mp4"):
+        filepath = filepath.rsplit(".", 1)[0] + ".mp4"
+
+    # estimates can be off, and the fallback has no size at all
+    if os.path.getsize(filepath) > limit:
+        os.remove(filepath)
+        raise ValueError(f"Video larger than {limit // 1024 // 1024}MB.")
+
+    final_path = os.path.join(tmpdir, generate_filename("mp4"))
+    os.replace(filepath, final_path)
+    return final_path
+
+
+def main():
+    # building the instance loads every extractor, so the first real job starts warm
+    get_ydl()
+    serve(lambda job: {"path": download(job["url"], job["dir"])})
+
+
+if __name__ == "__main__":
+    main()